@@ -0,0 +1,138 @@
+"""
+Storage format for Analysis.analysis_results.
+
+Full results embed every recommended career and course object, so each saved
+analysis repeats kilobytes of catalog data. They are stored compacted instead:
+the catalog version, and per recommendation the career ID, score, skill gap
+(lowercased skill IDs) and course IDs. expand_results() rebuilds the full
+objects from the catalog version the analysis was made with.
+
+Rows saved before this format are converted by the one-off command
+`flask migrate-analysis-results` (see app.py). Their careers and courses are
+matched against a known catalog version; those from catalog data that has since
+changed are collected into a "legacy" catalog version of their own
+(build_legacy_catalog), so no history is lost.
+"""
+import hashlib
+import json
+
+from catalog import freeze, normalize_entries, thaw
+
+RESULTS_FORMAT_FULL = 1
+RESULTS_FORMAT_COMPACT = 2
+
+class ArchivedCatalog:
+    """The careers and courses of an earlier catalog version, as needed to expand results. Read-only."""
+
+    def __init__(self, version, careers, courses):
+        self.version = version
+        self.careers = freeze(careers)
+        self.courses = freeze(courses)
+        self.careers_by_id = {career['id']: career for career in self.careers}
+        self.courses_by_id = {course['id']: course for course in self.courses}
+
+def is_compact(stored_results):
+    return stored_results.get('format') == RESULTS_FORMAT_COMPACT
+
+def compact_results(analysis_results):
+    """Returns the compact form of full analysis results made with a known catalog version."""
+    return {
+        'format': RESULTS_FORMAT_COMPACT,
+        'catalog_version': analysis_results['catalog_version'],
+        'user_skills': list(analysis_results.get('user_skills', [])),
+        'skill_matches': analysis_results.get('skill_matches') or {},
+        'recommendations': [
+            {
+                'career': rec['career']['id'],
+                # Some early analyses stored the score under `match_score`.
+                'score': rec.get('score', rec.get('match_score')) or 0.0,
+                'skill_gap': [skill.lower() for skill in rec.get('skill_gap', [])],
+                'courses': [course['id'] for course in rec.get('course_recommendations', [])],
+            }
+            for rec in analysis_results.get('recommendations', [])
+        ],
+    }
+
+def expand_results(stored_results, catalog):
+    """
+    Rebuilds full analysis results from compact ones using `catalog` (a
+    CatalogSnapshot or ArchivedCatalog). Careers and courses are the catalog's
+    read-only objects; those missing from the catalog are left out.
+    """
+    recommendations = []
+    for rec in stored_results['recommendations']:
+        career = catalog.careers_by_id.get(rec['career'])
+        if career is None:
+            continue
+        recommendations.append({
+            'career': career,
+            'score': rec['score'],
+            'skill_gap': list(rec['skill_gap']),
+            'course_recommendations': [catalog.courses_by_id[course_id] for course_id in rec['courses']
+                                       if course_id in catalog.courses_by_id],
+        })
+    return {
+        'catalog_version': catalog.version,
+        'user_skills': list(stored_results['user_skills']),
+        'skill_matches': stored_results.get('skill_matches') or {},
+        'recommendations': recommendations,
+    }
+
+# --- Converting full results ---
+# Full results from older releases may lack IDs, so careers and courses are
+# identified by their content, leaving out what normalization and rendering add.
+
+# Keys added to careers by catalog normalization or when results are rendered.
+_DERIVED_CAREER_KEYS = ('id', 'category', 'project_ideas_detailed')
+
+def _career_fingerprint(career):
+    fields = thaw({k: v for k, v in career.items() if k not in _DERIVED_CAREER_KEYS})
+    fields['project_ideas'] = [
+        {**{k: v for k, v in p.items() if k != 'video_id'}, 'name': p.get('name') or p.get('title', '')}
+        for p in fields.get('project_ideas', [])
+    ]
+    return json.dumps(fields, sort_keys=True)
+
+def _course_fingerprint(course):
+    return json.dumps(thaw({k: v for k, v in course.items() if k != 'id'}), sort_keys=True)
+
+class LegacyResultsConverter:
+    """Compacts full analysis results against one catalog version, when they still match it."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._career_ids = {_career_fingerprint(c): career_id for career_id, c in catalog.careers_by_id.items()}
+        self._course_ids = {_course_fingerprint(c): course_id for course_id, c in catalog.courses_by_id.items()}
+
+    def convert(self, analysis_results):
+        """Returns the compact results, or None if any career or course is not in this catalog version."""
+        recommendations = []
+        for rec in analysis_results.get('recommendations', []):
+            career_id = self._career_ids.get(_career_fingerprint(rec['career']))
+            course_ids = [self._course_ids.get(_course_fingerprint(c)) for c in rec.get('course_recommendations', [])]
+            if career_id is None or None in course_ids:
+                return None
+            recommendations.append({
+                **rec,
+                'career': {'id': career_id},
+                'course_recommendations': [{'id': course_id} for course_id in course_ids],
+            })
+        return compact_results({**analysis_results, 'catalog_version': self.catalog.version,
+                                'recommendations': recommendations})
+
+def build_legacy_catalog(full_results):
+    """
+    Returns an ArchivedCatalog of the distinct careers and courses embedded in the
+    given full results. Its version is a hash of that data, prefixed "legacy-".
+    """
+    careers, courses = {}, {}
+    for analysis_results in full_results:
+        for rec in analysis_results.get('recommendations', []):
+            career = {k: v for k, v in rec['career'].items() if k not in ('id', 'project_ideas_detailed')}
+            careers.setdefault(_career_fingerprint(career), career)
+            for course in rec.get('course_recommendations', []):
+                courses.setdefault(_course_fingerprint(course), {k: v for k, v in course.items() if k != 'id'})
+
+    careers, courses = normalize_entries(list(careers.values()), list(courses.values()))
+    digest = hashlib.sha1(json.dumps([careers, courses], sort_keys=True).encode('utf-8')).hexdigest()
+    return ArchivedCatalog('legacy-' + digest[:12], careers, courses)
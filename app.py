@@ -1,19 +1,43 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+import startup
+from flask import Flask, Request, Response, current_app, get_template_attribute, render_template, request, jsonify, redirect, url_for, flash
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
+from sqlalchemy import and_, or_, event
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import load_only
 from dotenv import load_dotenv
 from datetime import datetime
+import click
+import json
 import logging
 import os
-
-from data_loader import load_json_data
-from skill_mapper import extract_skills
-from recommender import recommend_careers, analyze_skill_gap, recommend_courses
-from youtube_service import get_video_details, extract_video_id_from_url, search_videos
+import sqlite3
+import threading
+
+import metrics
+from catalog import get_catalog, add_reload_listener, thaw
+from fragments import FragmentCache, career_card_key, courses_key
+from skill_mapper import extract_skill_matches
+from resume_parser import parse_resume, ResumeParseError, MAX_RESUME_BYTES
+from pipeline import get_recommendations, attach_project_details, LEARNING_PLAN_MODE
+from analysis_store import (
+    RESULTS_FORMAT_FULL, RESULTS_FORMAT_COMPACT, ArchivedCatalog, LegacyResultsConverter,
+    build_legacy_catalog, compact_results, expand_results, is_compact,
+)
+from youtube_service import (
+    get_video_details, search_videos,
+    collect_project_video_ids, prewarm_video_cache,
+)
+from video_enrichment import start_video_job, get_video_job_result
+from batch import iter_jsonl_items, run_batch, iter_ndjson, get_shared_pool
+from write_behind import WriteBehindQueue
+from ttl_cache import TTLCache, MISSING
+from auth import AuthBusyError, PasswordHasher
 
 # Set up basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+startup.mark('imports')
 
 # Load environment variables from .env file
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -24,34 +48,55 @@ else:
     # This is not a critical error, as the key might be set in the system's environment
     logging.info(".env file not found. Assuming environment variables are set globally.")
 
-# --- Resume Parsing Imports and Warnings ---
-missing_deps = []
-try:
-    import PyPDF2
-except ImportError:
-    PyPDF2 = None
-    missing_deps.append("PyPDF2")
-
-try:
-    import docx
-except ImportError:
-    docx = None
-    missing_deps.append("python-docx")
+class UploadLimitedRequest(Request):
+    """Applies BATCH_MAX_BYTES to /batch_analyze and MAX_CONTENT_LENGTH to every other route."""
 
-if missing_deps:
-    install_command = f"pip install {' '.join(missing_deps)}"
-    logging.warning(f"Optional dependencies not installed for resume parsing. To enable PDF/DOCX uploads, run: '{install_command}'")
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'batch_analyze':
+            return current_app.config['BATCH_MAX_BYTES']
+        return current_app.config['MAX_CONTENT_LENGTH']
 
 app = Flask(__name__)
+app.request_class = UploadLimitedRequest
 
 # --- New Configurations for Database and Session Management ---
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a_very_secret_dev_key')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///database.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Reject oversized uploads before they are read; leave room for the form fields.
+app.config['MAX_CONTENT_LENGTH'] = MAX_RESUME_BYTES + 1024 * 1024
+# /batch_analyze takes many resumes per request; each one is still held to MAX_RESUME_BYTES.
+app.config['BATCH_MAX_BYTES'] = int(os.environ.get('BATCH_MAX_BYTES', 50 * 1024 * 1024))
+# Number of past analyses shown per profile page.
+app.config['PROFILE_PAGE_SIZE'] = int(os.environ.get('PROFILE_PAGE_SIZE', 20))
+# Upper bound on how many ranked careers the results page shows.
+app.config['MAX_RECOMMENDATIONS'] = int(os.environ.get('MAX_RECOMMENDATIONS', 10))
+# 'all' lists every course for a career's skill gap; 'minimal' a smallest covering set.
+app.config['LEARNING_PLAN_MODE'] = LEARNING_PLAN_MODE
+# When enabled, results render immediately and project video details are fetched
+# in the background, then pulled by the page from /analysis/<id>/videos.
+app.config['DEFERRED_VIDEO_DETAILS'] = os.environ.get('DEFERRED_VIDEO_DETAILS', '').lower() in ('1', 'true', 'yes')
+# By default new analyses are saved by a background writer and the results page
+# renders before the row is durable. Strict mode commits before rendering.
+app.config['STRICT_ANALYSIS_WRITES'] = os.environ.get('STRICT_ANALYSIS_WRITES', '').lower() in ('1', 'true', 'yes')
+# SQLite waits this long for a competing writer's lock before failing.
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+# How long (in seconds) a logged-in user's identity is reused without reading the
+# user table; 0 reads it on every request.
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 300))
+# bcrypt runs on this many threads per process (0 runs it on the request thread).
+app.config['BCRYPT_WORKERS'] = int(os.environ.get('BCRYPT_WORKERS', 2))
 
 # --- Initialize Extensions ---
 db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
+password_hasher = PasswordHasher(
+    bcrypt,
+    max_workers=app.config['BCRYPT_WORKERS'],
+    max_pending=int(os.environ.get('BCRYPT_MAX_PENDING', 32)),
+    per_user_limit=int(os.environ.get('BCRYPT_PER_USER_LIMIT', 2)),
+)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'  # Redirect to /login if user is not authenticated
 login_manager.login_message = "Please log in to access this page."
@@ -63,30 +108,401 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(20), unique=True, nullable=False)
     password_hash = db.Column(db.String(60), nullable=False)
 
+    # Both raise AuthBusyError when the password hasher is at its limits.
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(self.username, password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.username, self.password_hash, password)
+
+# --- Logged-in identity ---
+# Flask-Login loads the user on every authenticated request. The identity is a
+# detached snapshot cached per process, so most requests never touch the user
+# table. Updating or deleting a User row drops its entry in this process; other
+# worker processes see the change once USER_CACHE_TTL expires. Only users that
+# exist are cached, so an ID reused by a new account is never served as unknown.
+class AuthUser(UserMixin):
+    """The logged-in user as seen by request handlers (current_user)."""
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username)
+
+identity_cache = TTLCache(maxsize=int(os.environ.get('USER_CACHE_SIZE', 10000)))
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_identity(mapper, connection, user):
+    identity_cache.pop(user.id)
 
 # --- New Analysis Model for Database ---
 class Analysis(db.Model):
+    # Serves the profile history: a user's analyses, newest first.
+    __table_args__ = (db.Index('ix_analysis_user_timestamp', 'user_id', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     user_input = db.Column(db.Text, nullable=False)
     analysis_results = db.Column(db.JSON, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Summary of the top recommendation, so history listings never load the large columns.
+    top_career = db.Column(db.String(120))
+    top_score = db.Column(db.Float)
+    # RESULTS_FORMAT_COMPACT for results stored by ID (see analysis_store.py),
+    # RESULTS_FORMAT_FULL for older rows that could not be converted, NULL if not yet migrated.
+    results_format = db.Column(db.Integer)
 
     author = db.relationship('User', backref=db.backref('analyses', lazy=True))
 
+    def set_summary(self, analysis_results):
+        """Fills the summary columns from the full analysis results."""
+        recommendations = analysis_results.get('recommendations') or []
+        top_rec = recommendations[0] if recommendations else None
+        self.top_career = top_rec['career'].get('title') if top_rec else None
+        # Some early analyses stored the score under `match_score`.
+        self.top_score = (top_rec.get('score', top_rec.get('match_score')) or 0.0) if top_rec else 0.0
+
+# --- Catalog archive ---
+# Compact analyses refer to careers and courses by ID within a catalog version.
+# Each version's careers and courses are archived once, so analyses made with an
+# earlier catalog still render as they were after the catalog changes.
+class CatalogArchive(db.Model):
+    version = db.Column(db.String(40), primary_key=True)
+    careers = db.Column(db.JSON, nullable=False)
+    courses = db.Column(db.JSON, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Columns added after the first release; create_all() does not add columns to
+# existing tables, so upgrade_schema() adds them to older databases.
+ANALYSIS_ADDED_COLUMNS = {
+    'top_career': 'VARCHAR(120)',
+    'top_score': 'FLOAT',
+    'results_format': 'INTEGER',
+}
+
+def _create_missing(create, attempts=3):
+    """
+    Runs a check-then-create step such as create_all(). Every gunicorn worker runs
+    it at startup, so another worker may create the same table or index between
+    the check and the CREATE; the step is then simply checked again.
+    """
+    for attempt in range(attempts):
+        try:
+            return create()
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+
+def upgrade_schema():
+    """
+    Creates missing tables, columns and indexes. Safe to run from several workers
+    at once; rewriting existing rows is left to the flask commands below.
+    """
+    _create_missing(db.create_all)
+
+    existing_columns = {column['name'] for column in db.inspect(db.engine).get_columns('analysis')}
+    for name, column_type in ANALYSIS_ADDED_COLUMNS.items():
+        if name not in existing_columns:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(db.text(f'ALTER TABLE analysis ADD COLUMN {name} {column_type}'))
+            except OperationalError:
+                # Another worker added it first.
+                pass
+    for index in Analysis.__table__.indexes:
+        _create_missing(lambda: index.create(db.engine, checkfirst=True))
+
+@app.cli.command('backfill-analysis-summaries')
+def backfill_analysis_summaries_command():
+    """
+    Fills in the top career and score of analyses saved before those columns
+    existed; until then the profile page lists them without a top career.
+    Run it once after upgrading, from a single process:
+
+        flask --app app backfill-analysis-summaries
+    """
+    filled = 0
+    for analysis in Analysis.query.filter(Analysis.top_score.is_(None)).yield_per(200):
+        analysis.set_summary(load_analysis_results(analysis))
+        filled += 1
+    db.session.commit()
+    click.echo(f"Filled in the summaries of {filled} analyses.")
+
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    """Returns the AuthUser for a session's user ID, from the identity cache when possible."""
+    user_id, ttl = int(user_id), app.config['USER_CACHE_TTL']
+    if ttl > 0:
+        auth_user = identity_cache.get(user_id, MISSING)
+        if auth_user is not MISSING:
+            return auth_user
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    auth_user = AuthUser.from_user(user)
+    if ttl > 0:
+        identity_cache.set(user_id, auth_user, ttl=ttl)
+    return auth_user
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Lets readers proceed while a write is in progress (WAL), makes commits cheaper
+    (synchronous=NORMAL is durable across application crashes in WAL mode) and
+    waits for a busy lock instead of failing immediately.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+    cursor.close()
+
+def write_analyses(analyses):
+    """Inserts a batch of new analyses in a single transaction."""
+    with app.app_context():
+        try:
+            db.session.add_all(analyses)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+def is_database_busy(exc):
+    """
+    True for a write that failed only because another connection held the SQLite
+    lock. Other OperationalErrors (a read-only database, a full disk, a missing
+    table) will not go away by retrying.
+    """
+    if not isinstance(exc, OperationalError):
+        return False
+    orig = exc.orig
+    code = getattr(orig, 'sqlite_errorcode', None)
+    if code is not None:
+        # Extended result codes keep the primary code in the low byte.
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(orig).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+# New analyses are queued here and committed in groups by a background thread.
+analysis_writer = WriteBehindQueue(
+    write_analyses,
+    maxsize=int(os.environ.get('ANALYSIS_WRITE_QUEUE_SIZE', 1000)),
+    batch_size=int(os.environ.get('ANALYSIS_WRITE_BATCH_SIZE', 100)),
+    max_delay=float(os.environ.get('ANALYSIS_WRITE_MAX_DELAY', 0.05)),
+    name='analysis-writer',
+    is_transient=is_database_busy,
+    max_retry_time=float(os.environ.get('ANALYSIS_WRITE_MAX_RETRY_TIME', 30)),
+    key=lambda analysis: analysis.user_id,
+)
+
+startup.mark('extensions')
+
+# Archived catalog versions recently used to expand past analyses.
+_archived_catalogs = TTLCache(maxsize=int(os.environ.get('ARCHIVED_CATALOG_CACHE_SIZE', 4)))
+
+def archive_catalog(catalog):
+    """Stores the careers and courses of a catalog version, unless they are already archived."""
+    with app.app_context():
+        if db.session.get(CatalogArchive, catalog.version) is not None:
+            return
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(CatalogArchive.__table__.insert().values(
+                    version=catalog.version, careers=thaw(catalog.careers), courses=thaw(catalog.courses),
+                    archived_at=datetime.utcnow(),
+                ))
+        except IntegrityError:
+            # Another worker archived it first.
+            pass
+
+def get_catalog_version(version):
+    """Returns the current catalog if it has this version, else the archived one, or None."""
+    catalog = get_catalog()
+    if catalog.version == version:
+        return catalog
+    archived = _archived_catalogs.get(version)
+    if archived is None:
+        entry = db.session.get(CatalogArchive, version)
+        if entry is None:
+            return None
+        archived = ArchivedCatalog(entry.version, entry.careers, entry.courses)
+        _archived_catalogs.set(version, archived)
+    return archived
+
+def load_analysis_results(analysis):
+    """
+    Returns the full results of a saved analysis, expanding compact ones from the
+    catalog version they were made with. If that version is not archived (e.g. the
+    archive table was cleared), the current catalog is used instead.
+    """
+    stored = analysis.analysis_results
+    if not is_compact(stored):
+        return stored
+    catalog = get_catalog_version(stored['catalog_version'])
+    if catalog is None:
+        logging.warning(f"Catalog version {stored['catalog_version']} of analysis {analysis.id} is not archived; "
+                        f"showing it with the current catalog.")
+        catalog = get_catalog()
+    return expand_results(stored, catalog)
+
+def migrate_analysis_results(catalog, backup_path=None):
+    """
+    Converts analyses saved with full results to the compact format. Rows whose
+    careers and courses match their own catalog version or the current one are
+    compacted against it; the rest against a legacy catalog version built from
+    their own data. Rows that still cannot be converted keep their full results.
+    With `backup_path`, the stored results of every row to convert are first
+    written there as JSON lines ({"id", "analysis_results"}).
+    Returns the number of rows compacted, archived as legacy, and kept in full.
+    """
+    converters = {}
+    def converter_for(version):
+        if version not in converters:
+            candidate = get_catalog_version(version)
+            converters[version] = candidate and LegacyResultsConverter(candidate)
+        return converters[version]
+
+    pending = lambda: Analysis.query.filter(Analysis.results_format.is_(None))
+    if pending().first() is None:
+        return 0, 0, 0
+
+    if backup_path:
+        with open(backup_path, 'w', encoding='utf-8') as f:
+            for analysis in pending().options(load_only(Analysis.id, Analysis.analysis_results)).yield_per(200):
+                f.write(json.dumps({'id': analysis.id, 'analysis_results': analysis.analysis_results}) + "\n")
+
+    def convert_pending(find_converters):
+        converted = 0
+        for analysis in pending().yield_per(200):
+            results = analysis.analysis_results
+            for converter in find_converters(results):
+                compact = converter.convert(results)
+                if compact is not None:
+                    analysis.analysis_results = compact
+                    analysis.results_format = RESULTS_FORMAT_COMPACT
+                    converted += 1
+                    break
+        db.session.commit()
+        return converted
+
+    matched = convert_pending(lambda results: filter(None, (
+        converter_for(version) for version in dict.fromkeys([results.get('catalog_version'), catalog.version]) if version
+    )))
 
-# Load all data at startup
-SKILLS_LIST = load_json_data('skills.json')
-CAREERS_DATA = load_json_data('careers.json')
-COURSES_DATA = load_json_data('courses.json')
+    legacy = build_legacy_catalog(analysis.analysis_results for analysis in pending().yield_per(200))
+    archived = 0
+    if legacy.careers_by_id:
+        archive_catalog(legacy)
+        archived = convert_pending(lambda results: [LegacyResultsConverter(legacy)])
+
+    kept = pending().update({Analysis.results_format: RESULTS_FORMAT_FULL})
+    db.session.commit()
+    logging.info(f"Migrated analysis results: {matched} compacted against catalog versions, "
+                 f"{archived} against legacy version {legacy.version}, {kept} kept in full.")
+    return matched, archived, kept
+
+@app.cli.command('migrate-analysis-results')
+@click.option('--backup', 'backup_path', type=click.Path(dir_okay=False),
+              help="Where to save the original results (default: a timestamped file in the instance folder).")
+@click.option('--no-backup', is_flag=True, help="Rewrite rows without saving their original results.")
+def migrate_analysis_results_command(backup_path, no_backup):
+    """
+    Converts analyses saved in the full results format to the compact one.
+    Run it once after deploying, from a single process:
+
+        flask --app app migrate-analysis-results
+    """
+    if no_backup:
+        backup_path = None
+    elif backup_path is None:
+        os.makedirs(app.instance_path, exist_ok=True)
+        backup_path = os.path.join(app.instance_path,
+                                   f"analysis-results-backup-{datetime.utcnow():%Y%m%d-%H%M%S}.jsonl")
+    matched, archived, kept = migrate_analysis_results(get_catalog(), backup_path=backup_path)
+    if not matched + archived + kept:
+        click.echo("No analyses to migrate.")
+        return
+    if backup_path:
+        click.echo(f"Original results saved to {backup_path}.")
+    click.echo(f"{matched} analyses compacted against catalog versions, {archived} against a legacy "
+               f"catalog version, {kept} kept in full.")
+
+# --- Career card fragments ---
+# The catalog-static parts of each career card are rendered once per catalog
+# version; results pages splice them together with the per-user score and gap.
+fragment_cache = FragmentCache(
+    maxsize=int(os.environ.get('FRAGMENT_CACHE_SIZE', 4096)),
+    maxbytes=int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+    current_version=lambda: get_catalog().version,
+)
+
+def drop_stale_fragments(old_catalog, new_catalog):
+    if old_catalog.version != new_catalog.version:
+        fragment_cache.drop_version(old_catalog.version)
+
+def initialize():
+    """
+    Brings the database schema up to date, loads the catalog and starts optional
+    background work. Runs once per server process, when this module is imported.
+    """
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_sqlite_pragmas)
+        # This will create the database file and tables if they don't exist,
+        # and bring databases created by older versions up to date.
+        upgrade_schema()
+    startup.mark('schema')
+
+    # Load and compile the catalog at startup; get_catalog() swaps in a new snapshot
+    # whenever one of the catalog files changes on disk. Analyses saved in the full
+    # format stay readable; `flask migrate-analysis-results` compacts them.
+    with app.app_context():
+        archive_catalog(get_catalog())
+    startup.mark('catalog')
+    add_reload_listener(drop_stale_fragments)
+    add_reload_listener(lambda old_catalog, new_catalog: archive_catalog(new_catalog))
+
+    # Optionally fill the YouTube video cache in the background at startup, so
+    # steady-state requests are served without calling the API.
+    if os.environ.get('YOUTUBE_PREWARM', '').lower() in ('1', 'true', 'yes'):
+        threading.Thread(target=prewarm_video_cache, args=(get_catalog().careers,), daemon=True).start()
+
+    startup.finish()
+
+# Resume parse and batch analysis workers are spawned, and spawning re-imports the
+# main module as __mp_main__; under `python app.py` that is this file, and those
+# workers need none of the server's startup.
+if __name__ != '__mp_main__':
+    initialize()
+
+@app.template_global()
+def career_card(career, catalog_version, deferred_videos=False):
+    """
+    Returns the cached static parts of a career card, as markup keyed by part:
+    'title', 'description' and 'projects' (the macros in _career_card.html).
+    """
+    def render():
+        macro = lambda name: get_template_attribute('_career_card.html', name)
+        return {
+            'title': macro('title')(career),
+            'description': macro('description')(career),
+            'projects': macro('projects')(career, deferred_videos) if career.get('project_ideas_detailed') else '',
+        }
+    # Analyses saved by older releases have no catalog version or career IDs;
+    # their cards are rendered but not cached.
+    return fragment_cache.get_or_render(catalog_version if catalog_version and career.get('id') else None,
+                                        career_card_key(career, deferred_videos), render)
+
+@app.template_global()
+def courses_fragment(courses, catalog_version):
+    """Returns the cached markup of a card's course list."""
+    render = lambda: get_template_attribute('_career_card.html', 'courses')(courses)
+    return fragment_cache.get_or_render(catalog_version or None, courses_key(courses), render)
 
 @app.route('/')
 def index():
@@ -113,7 +529,11 @@ def signup():
             return redirect(url_for('signup'))
         
         new_user = User(username=username)
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except AuthBusyError as e:
+            flash(str(e), 'error')
+            return render_template('signup.html', title="Sign Up"), 429
         db.session.add(new_user)
         db.session.commit()
         flash('Account created! You can now log in.', 'success')
@@ -128,8 +548,13 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
-            login_user(user, remember=True)
+        try:
+            valid = user is not None and user.check_password(password)
+        except AuthBusyError as e:
+            flash(str(e), 'error')
+            return render_template('login.html', title="Login"), 429
+        if valid:
+            login_user(AuthUser.from_user(user), remember=True)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('index'))
         else:
@@ -145,159 +570,244 @@ def logout():
 @login_required
 def profile():
     """Displays the user's profile page with past analyses."""
+    # Make analyses this worker has just accepted for this user visible in the history.
+    analysis_writer.flush(timeout=1.0, key=current_user.id)
     # Query analyses for the current user, ordered by most recent first
-    past_analyses = Analysis.query.filter_by(user_id=current_user.id).order_by(Analysis.timestamp.desc()).all()
-    return render_template('profile.html', analyses=past_analyses, title="My Profile")
+    # Only the summary columns are loaded, one page at a time. Pages are addressed by
+    # the (timestamp, id) of the last analysis shown, which the composite index serves directly.
+    query = Analysis.query.filter_by(user_id=current_user.id).options(
+        load_only(Analysis.id, Analysis.timestamp, Analysis.top_career, Analysis.top_score)
+    )
+
+    cursor = request.args.get('before')
+    if cursor:
+        try:
+            cursor_timestamp, cursor_id = cursor.rsplit('_', 1)
+            cursor_timestamp, cursor_id = datetime.fromisoformat(cursor_timestamp), int(cursor_id)
+        except ValueError:
+            return redirect(url_for('profile'))
+        query = query.filter(or_(
+            Analysis.timestamp < cursor_timestamp,
+            and_(Analysis.timestamp == cursor_timestamp, Analysis.id < cursor_id),
+        ))
+
+    page_size = app.config['PROFILE_PAGE_SIZE']
+    past_analyses = query.order_by(Analysis.timestamp.desc(), Analysis.id.desc()).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(past_analyses) > page_size:
+        past_analyses = past_analyses[:page_size]
+        last = past_analyses[-1]
+        next_cursor = f"{last.timestamp.isoformat()}_{last.id}"
+
+    return render_template('profile.html', analyses=past_analyses, next_cursor=next_cursor,
+                           is_first_page=not cursor, title="My Profile")
 
 @app.route('/analysis/<int:analysis_id>')
 @login_required
 def view_analysis(analysis_id):
     """Displays the results of a specific past analysis."""
+    analysis_writer.flush(timeout=1.0, key=current_user.id)
     analysis = Analysis.query.get_or_404(analysis_id)
 
     # Security check: Ensure the current user owns this analysis
-    if analysis.author != current_user:
+    if analysis.user_id != current_user.id:
         flash("You are not authorized to view this analysis.", "error")
         return redirect(url_for('profile'))
 
-    return render_template('results.html', analysis=analysis.analysis_results, title="Past Analysis Results", from_history=True)
-
-def extract_text_from_file(file_storage):
-    """Extracts text from an uploaded file (PDF, DOCX, TXT)."""
-    filename = file_storage.filename
-    stream = file_storage.stream
-
-    def read_pdf(s):
-        if not PyPDF2:
-            flash("PDF processing is not available. Please install PyPDF2.", "error")
-            return None
-        pdf_reader = PyPDF2.PdfReader(s)
-        return "".join(page.extract_text() or "" for page in pdf_reader.pages)
-
-    def read_docx(s):
-        if not docx:
-            flash("DOCX processing is not available. Please install python-docx.", "error")
-            return None
-        document = docx.Document(s)
-        return "\n".join(para.text for para in document.paragraphs)
-
-    def read_txt(s):
-        return s.read().decode('utf-8')
+    analysis_results = load_analysis_results(analysis)
+    video_details_url = url_for('analysis_videos', analysis_id=analysis.id) if app.config['DEFERRED_VIDEO_DETAILS'] else None
+    if is_compact(analysis.analysis_results):
+        # Compact results do not store video details; they are served from the video cache.
+        careers = [rec['career'] for rec in analysis_results['recommendations']]
+        all_project_video_ids = collect_project_video_ids(careers)
+        details_map = {}
+        if all_project_video_ids and not video_details_url:
+            details_map = {detail['id']: detail for detail in get_video_details(all_project_video_ids)}
+        attach_project_details(analysis_results['recommendations'], details_map)
+    return render_template('results.html', analysis=analysis_results, title="Past Analysis Results",
+                           from_history=True, video_details_url=video_details_url)
+
+@app.route('/analysis/<int:analysis_id>/videos')
+@login_required
+def analysis_videos(analysis_id):
+    """Returns the project video details for an analysis as JSON once they are available."""
+    analysis = Analysis.query.get_or_404(analysis_id)
 
-    handlers = {
-        '.pdf': {'func': read_pdf, 'name': 'PDF'},
-        '.docx': {'func': read_docx, 'name': 'DOCX'},
-        '.txt': {'func': read_txt, 'name': 'TXT'},
-    }
+    if analysis.user_id != current_user.id:
+        return jsonify({'error': 'You are not authorized to view this analysis.'}), 403
 
-    file_ext = os.path.splitext(filename)[1].lower()
-    handler_info = handlers.get(file_ext)
+    careers = [rec['career'] for rec in load_analysis_results(analysis).get('recommendations', [])]
+    details_map = get_video_job_result(analysis.id, collect_project_video_ids(careers))
+    if details_map is None:
+        # Still fetching; the page polls again shortly.
+        return jsonify({'status': 'pending'}), 202
+    return jsonify({'status': 'ready', 'videos': details_map})
 
-    if not handler_info:
-        flash("Unsupported file type. Please upload a PDF, DOCX, or TXT file.", "error")
-        return None
+@app.route('/project_videos')
+@login_required
+def project_videos():
+    """
+    Returns project video details for the given careers (?careers=<id>,<id>) as JSON.
+    Used by results pages whose analysis may not have been saved yet.
+    """
+    catalog = get_catalog()
+    careers = [catalog.careers_by_id[career_id] for career_id in request.args.get('careers', '').split(',')
+               if career_id in catalog.careers_by_id]
+    video_ids = catalog.project_video_ids(careers)
+    details_map = get_video_job_result(tuple(video_ids), video_ids)
+    if details_map is None:
+        return jsonify({'status': 'pending'}), 202
+    return jsonify({'status': 'ready', 'videos': details_map})
 
+def extract_text_from_file(file_storage):
+    """Extracts text from an uploaded file (PDF, DOCX, TXT), flashing an error on failure."""
     try:
-        # The handler function might return None if a dependency is missing,
-        # in which case it will have already flashed a message.
-        return handler_info['func'](stream)
-    except Exception as e:
-        file_type_name = handler_info['name']
-        logging.error(f"Error reading {file_type_name} file: {e}")
-        flash(f"Could not read the uploaded {file_type_name} file. It might be corrupted or protected.", "error")
+        return parse_resume(file_storage.filename, file_storage.stream)
+    except ResumeParseError as e:
+        flash(str(e), "error")
         return None
 
 @app.route('/analyze', methods=['POST'])
 @login_required # This route is now protected
+@metrics.timed('analyze_request_seconds')
 def analyze():
     """Processes user input and displays recommendations."""
     user_input = request.form.get('user_input', '')
     resume_file = request.files.get('resume_file')
 
     if resume_file and resume_file.filename != '':
-        extracted_text = extract_text_from_file(resume_file)
+        with metrics.timer('analyze_stage_seconds', stage='parse'):
+            extracted_text = extract_text_from_file(resume_file)
         if extracted_text is None:
             return redirect(url_for('index')) # Flash message is already set in the helper
         user_input = extracted_text
 
-    if not user_input.strip() or not SKILLS_LIST or not CAREERS_DATA or not COURSES_DATA:
+    # Use one catalog snapshot for the whole request, even if a reload happens meanwhile.
+    catalog = get_catalog()
+
+    if not user_input.strip() or not catalog.is_loaded:
         # Handle case where data failed to load or input is empty
         flash("Could not process request due to missing data or input.", "error")
         return redirect(url_for('index'))
 
     # 1. Extract skills from user input
-    user_skills = extract_skills(user_input, SKILLS_LIST)
-
-    # 2. Get career recommendations
-    career_recommendations = recommend_careers(user_skills, CAREERS_DATA)
-
-    # --- New: Efficiently fetch all YouTube video details at once ---
-    all_project_video_ids = set()
-    for rec in career_recommendations:
-        for p in rec['career'].get('project_ideas', []):
-            video_id = extract_video_id_from_url(p.get('youtube_url', ''))
-            if video_id:
-                all_project_video_ids.add(video_id)
-    
-    all_details_map = {}
-    if all_project_video_ids:
-        video_details_list = get_video_details(list(all_project_video_ids))
-        all_details_map = {detail['id']: detail for detail in video_details_list}
-
-    # 3. For EACH recommendation, perform skill gap analysis and add project details
-    for rec in career_recommendations:
-        career = rec['career']
-        required_skills = career['required_skills']
+    with metrics.timer('analyze_stage_seconds', stage='extract'):
+        skill_matches = extract_skill_matches(user_input, catalog.skill_matcher)
+    user_skills = [match['skill'] for match in skill_matches]
 
-        # Analyze skill gap and add to the recommendation object
-        skill_gap = analyze_skill_gap(user_skills, required_skills)
-        rec['skill_gap'] = skill_gap
+    # 2. Get career recommendations, with skill gaps and courses for each.
+    # These depend only on the skill set and catalog version, so they are memoized.
+    with metrics.timer('analyze_stage_seconds', stage='rank'):
+        career_recommendations = get_recommendations(user_skills, catalog, top_k=app.config['MAX_RECOMMENDATIONS'],
+                                                     plan_mode=app.config['LEARNING_PLAN_MODE'])
 
-        # Recommend courses and add to the recommendation object
-        course_recs = recommend_courses(skill_gap, COURSES_DATA)
-        rec['course_recommendations'] = course_recs
+    # 3. Efficiently fetch all YouTube video details at once and add them to the project ideas
+    all_project_video_ids = catalog.project_video_ids(rec['career'] for rec in career_recommendations)
 
-        # --- Corrected YouTube Project Suggestion Logic ---
-        # This logic correctly associates project ideas from careers.json with details fetched from the YouTube API.
-        project_ideas = career.get('project_ideas', [])
-
-        # Reconstruct the project ideas list, combining original data with fetched details.
-        # This preserves the original order from careers.json.
-        detailed_project_ideas = []
-        for p in project_ideas:
-            video_id = extract_video_id_from_url(p.get('youtube_url', ''))
-            detailed_project_ideas.append({**p, 'details': all_details_map.get(video_id)})
+    deferred_videos = app.config['DEFERRED_VIDEO_DETAILS']
+    all_details_map = {}
+    if all_project_video_ids and not deferred_videos:
+        with metrics.timer('analyze_stage_seconds', stage='youtube'):
+            video_details_list = get_video_details(all_project_video_ids)
+        all_details_map = {detail['id']: detail for detail in video_details_list}
 
-        rec['career']['project_ideas_detailed'] = detailed_project_ideas
+    attach_project_details(career_recommendations, all_details_map)
 
     analysis_results = {
+        'catalog_version': catalog.version,
         'user_skills': user_skills,
+        # How skills that were not written out exactly were recognized (alias or fuzzy hit).
+        'skill_matches': {match['skill']: match for match in skill_matches if match['source'] != 'exact'},
         'recommendations': career_recommendations
     }
 
     # --- New: Save the analysis to the database ---
+    # Stored by ID; view_analysis() expands it from the catalog.
     new_analysis = Analysis(
+        user_id=current_user.id,
         user_input=user_input,
-        analysis_results=analysis_results,
-        author=current_user
+        analysis_results=compact_results(analysis_results),
+        results_format=RESULTS_FORMAT_COMPACT,
+        timestamp=datetime.utcnow(),
     )
-    db.session.add(new_analysis)
-    db.session.commit()
+    new_analysis.set_summary(analysis_results)
+
+    # Hand the row to the background writer; if strict mode is on or the queue is
+    # full, commit it here before rendering.
+    queued = False
+    if not app.config['STRICT_ANALYSIS_WRITES']:
+        with metrics.timer('analyze_stage_seconds', stage='db_enqueue'):
+            queued = analysis_writer.submit(new_analysis)
+    if not queued:
+        db.session.add(new_analysis)
+        with metrics.timer('analyze_stage_seconds', stage='db_commit'):
+            db.session.commit()
+
+    # In deferred mode the page renders now and pulls video details once they arrive.
+    # A queued analysis has no ID yet, so its videos are looked up by career instead.
+    video_details_url = None
+    if deferred_videos and all_project_video_ids:
+        if queued:
+            start_video_job(tuple(all_project_video_ids), all_project_video_ids)
+            video_details_url = url_for('project_videos', careers=','.join(rec['career']['id'] for rec in career_recommendations))
+        else:
+            start_video_job(new_analysis.id, all_project_video_ids)
+            video_details_url = url_for('analysis_videos', analysis_id=new_analysis.id)
+
+    with metrics.timer('analyze_stage_seconds', stage='render'):
+        return render_template('results.html', analysis=analysis_results, title="Analysis Results",
+                               video_details_url=video_details_url)
 
-    return render_template('results.html', analysis=analysis_results, title="Analysis Results")
+@app.route('/batch_analyze', methods=['POST'])
+@login_required
+def batch_analyze():
+    """
+    Analyzes many inputs in one request and streams NDJSON results as each completes.
+    Accepts a JSONL request body or multipart `resumes` file uploads. Failed items
+    are reported inline as {"id": ..., "error": ...} lines.
+    """
+    uploads = request.files.getlist('resumes')
+    if uploads:
+        # Uploads are read now; the response body is produced after the request is gone.
+        items = []
+        for upload in uploads:
+            if not upload.filename:
+                continue
+            data = upload.read(MAX_RESUME_BYTES + 1)
+            if len(data) > MAX_RESUME_BYTES:
+                items.append({'id': upload.filename, 'error': f"File is larger than {MAX_RESUME_BYTES} bytes."})
+            else:
+                items.append({'id': upload.filename, 'filename': upload.filename, 'data': data})
+    else:
+        items = list(iter_jsonl_items(request.get_data().splitlines()))
+
+    if not items:
+        return jsonify({'error': 'Provide a JSONL body or one or more resume files.'}), 400
+
+    results = run_batch(items, get_shared_pool(), top_k=app.config['MAX_RECOMMENDATIONS'],
+                        plan_mode=app.config['LEARNING_PLAN_MODE'])
+    return Response(iter_ndjson(results), mimetype='application/x-ndjson')
 
 @app.route('/search_videos', methods=['POST'])
 def search_youtube_videos():
     """Searches for YouTube videos based on a query from the client."""
-    query = request.json.get('query')
-    if not query:
+    payload = request.get_json(silent=True)
+    query = payload.get('query') if isinstance(payload, dict) else None
+    if not isinstance(query, str) or not query.strip():
         return jsonify({'error': 'Search query is required'}), 400
     
     videos = search_videos(query)
     return jsonify(videos)
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Exposes request stage latencies and YouTube API usage, summed across workers, for Prometheus."""
+    if not metrics.is_enabled():
+        return Response("Metrics are disabled.\n", status=404, mimetype='text/plain')
+    return Response(metrics.render_metrics(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
-    with app.app_context():
-        # This will create the database file and tables if they don't exist
-        db.create_all()
+    # Run directly, this process is the server; see gunicorn.conf.py for gunicorn.
+    metrics.export_default_directory()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+class AuthBusyError(Exception):
+    """Raised when a password hash or check is refused because too many are already running."""
+    pass
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and checking on a small, bounded thread pool.
+
+    A bcrypt call takes a large fraction of a second of CPU time, so a burst of
+    logins on a threaded worker would otherwise occupy every request thread. At
+    most `max_workers` calls run at once and at most `max_pending` wait for the
+    pool; one username may have at most `per_user_limit` calls in flight.
+    Requests beyond those limits get AuthBusyError straight away. With
+    `max_workers=0` calls run inline on the request thread, still limited per user.
+    """
+
+    def __init__(self, bcrypt, max_workers=2, max_pending=32, per_user_limit=2):
+        self.bcrypt = bcrypt
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.per_user_limit = per_user_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bcrypt') if max_workers else None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._pending = 0
+
+    def _acquire(self, username):
+        with self._lock:
+            if self._in_flight.get(username, 0) >= self.per_user_limit:
+                metrics.inc('password_hash_rejected_total', reason='per_user_limit')
+                raise AuthBusyError("Too many sign-in attempts for this account are in progress. Please try again.")
+            if self._executor and self._pending >= self.max_pending:
+                metrics.inc('password_hash_rejected_total', reason='busy')
+                raise AuthBusyError("The server is busy. Please try again in a moment.")
+            self._in_flight[username] = self._in_flight.get(username, 0) + 1
+            self._pending += 1
+
+    def _release(self, username):
+        with self._lock:
+            self._pending -= 1
+            if self._in_flight[username] <= 1:
+                del self._in_flight[username]
+            else:
+                self._in_flight[username] -= 1
+
+    def _run(self, username, operation, func, *args):
+        self._acquire(username)
+        try:
+            # Includes time spent waiting for the pool, which is what the request waits for.
+            with metrics.timer('password_hash_seconds', operation=operation):
+                if self._executor is None:
+                    return func(*args)
+                return self._executor.submit(func, *args).result()
+        finally:
+            self._release(username)
+
+    def hash(self, username, password):
+        """Returns the bcrypt hash of a password as text."""
+        return self._run(username, 'hash', self.bcrypt.generate_password_hash, password).decode('utf-8')
+
+    def check(self, username, password_hash, password):
+        """Returns True if the password matches the hash."""
+        return self._run(username, 'check', self.bcrypt.check_password_hash, password_hash, password)
@@ -0,0 +1,256 @@
+"""
+Batch analysis: runs skill extraction and recommendations for many inputs at once.
+
+Input is either JSONL (one object per line, e.g. requests.jsonl) or a directory
+of resumes. Results are written as NDJSON, one line per item as soon as it
+completes, so large batches are never buffered. A failing item produces an
+`error` line and the rest of the batch carries on; so does an item still running
+after BATCH_ITEM_TIMEOUT seconds.
+
+Usage:
+    python batch.py cohort.jsonl > results.ndjson
+    python batch.py resumes/ --workers 4 --top-k 5
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from catalog import get_catalog
+from pipeline import get_recommendations, LEARNING_PLAN_MODES
+from resume_parser import parse_resume, SUPPORTED_FORMATS
+from skill_mapper import extract_skill_matches
+
+# Seconds an item may run before it is reported as timed out.
+BATCH_ITEM_TIMEOUT = float(os.environ.get('BATCH_ITEM_TIMEOUT', 60.0))
+# How often run_batch() looks for timed-out items while waiting for results.
+_TIMEOUT_CHECK_INTERVAL = 0.5
+
+# Keys tried, in order, for an item's ID and text in JSONL input.
+ID_KEYS = ('id', 'request_id', 'analysis_id')
+TEXT_KEYS = ('text', 'user_input', 'resume_text')
+
+def iter_jsonl_items(lines):
+    """Turns JSONL lines into batch items. Lines that are not valid JSON become error items."""
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {'id': f"line-{line_number}", 'error': f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(record, dict):
+            yield {'id': f"line-{line_number}", 'error': "Each line must be a JSON object."}
+            continue
+
+        item_id = next((record[key] for key in ID_KEYS if key in record), f"line-{line_number}")
+        text = next((record[key] for key in TEXT_KEYS if key in record), None)
+        if text is None:
+            # Request-style records (title + body), as in requests.jsonl.
+            text = "\n".join(str(record[key]) for key in ('title', 'body') if key in record)
+        yield {'id': item_id, 'text': text}
+
+def iter_directory_items(path):
+    """Yields a batch item for every supported resume file in a directory."""
+    for filename in sorted(os.listdir(path)):
+        file_path = os.path.join(path, filename)
+        if os.path.isfile(file_path) and os.path.splitext(filename)[1].lower() in SUPPORTED_FORMATS:
+            yield {'id': filename, 'filename': filename, 'path': file_path}
+
+def analyze_item(item, top_k=None, plan_mode=None):
+    """
+    Analyzes one batch item and returns its result line.
+    Runs inside a worker process, which loads its own catalog snapshot once.
+    Resumes are parsed in a parse worker process of its own, under the same
+    hard timeout as uploads to /analyze.
+    """
+    if 'error' in item:
+        return {'id': item['id'], 'error': item['error']}
+
+    try:
+        text = item.get('text')
+        if text is None:
+            if 'path' in item:
+                with open(item['path'], 'rb') as f:
+                    data = f.read()
+            else:
+                data = item['data']
+            text = parse_resume(item['filename'], io.BytesIO(data))
+
+        if not text or not text.strip():
+            return {'id': item['id'], 'error': "No text to analyze."}
+
+        catalog = get_catalog()
+        skill_matches = extract_skill_matches(text, catalog.skill_matcher)
+        user_skills = [match['skill'] for match in skill_matches]
+        recommendations = get_recommendations(user_skills, catalog, top_k=top_k, plan_mode=plan_mode)
+    except Exception as e:
+        return {'id': item['id'], 'error': str(e)}
+
+    return {
+        'id': item['id'],
+        'catalog_version': catalog.version,
+        'user_skills': user_skills,
+        'skill_matches': [match for match in skill_matches if match['source'] != 'exact'],
+        'recommendations': [
+            {
+                'career_id': rec['career']['id'],
+                'title': rec['career']['title'],
+                'score': rec['score'],
+                'skill_gap': rec['skill_gap'],
+                'course_ids': [course['id'] for course in rec['course_recommendations']],
+            }
+            for rec in recommendations
+        ],
+    }
+
+class BatchPool(ProcessPoolExecutor):
+    """
+    A process pool for batch analysis that takes work only when a worker is free.
+
+    ProcessPoolExecutor marks queued items as running before any worker picks them
+    up, so a deadline measured from there would also count time spent queued.
+    try_submit() hands out at most one item per worker; an item holds its worker
+    until it really finishes, even after run_batch() has stopped waiting for it,
+    and every batch sharing the pool competes for the same workers.
+    """
+
+    def __init__(self, workers):
+        super().__init__(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self._free_workers = threading.BoundedSemaphore(workers)
+
+    def try_submit(self, fn, *args):
+        """Submits fn(*args) if a worker is free; otherwise returns None."""
+        if not self._free_workers.acquire(blocking=False):
+            return None
+        try:
+            future = self.submit(fn, *args)
+        except BrokenProcessPool as e:
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda _: self._free_workers.release())
+        return future
+
+def create_pool(workers):
+    """Creates a process pool for batch analysis; workers are spawned, not forked."""
+    return BatchPool(workers)
+
+def run_batch(items, pool, top_k=None, max_in_flight=16, plan_mode=None, item_timeout=BATCH_ITEM_TIMEOUT):
+    """
+    Runs items through a BatchPool and yields result lines as they complete.
+    Items are submitted only as pool workers come free, at most `max_in_flight`
+    at a time, so input is consumed lazily and memory stays bounded however large
+    the batch is. An item still running `item_timeout` seconds after a worker took
+    it gets an `error` line and is no longer waited for; None waits indefinitely.
+    """
+    items = iter(items)
+    pending = {}
+    # When each item was handed to a worker.
+    started = {}
+    # An item read from the input that is waiting for a free worker.
+    waiting = None
+
+    def submit_ready():
+        nonlocal waiting
+        while len(pending) < max_in_flight:
+            item = waiting if waiting is not None else next(items, None)
+            if item is None:
+                return
+            future = pool.try_submit(analyze_item, item, top_k, plan_mode)
+            if future is None:
+                waiting = item
+                return
+            waiting = None
+            pending[future] = item['id']
+            started[future] = time.monotonic()
+
+    submit_ready()
+    while pending or waiting is not None:
+        if pending:
+            done, _ = wait(pending, timeout=_TIMEOUT_CHECK_INTERVAL if item_timeout or waiting else None,
+                           return_when=FIRST_COMPLETED)
+        else:
+            # Every worker is busy with other batches' items.
+            time.sleep(_TIMEOUT_CHECK_INTERVAL)
+            done = ()
+        for future in done:
+            item_id = pending.pop(future)
+            del started[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker itself failed (e.g. it crashed); report it against the item.
+                yield {'id': item_id, 'error': f"Worker failure: {e}"}
+
+        if item_timeout:
+            now = time.monotonic()
+            for future in [f for f in pending if now - started[f] > item_timeout]:
+                item_id = pending.pop(future)
+                del started[future]
+                yield {'id': item_id, 'error': f"Timed out after {item_timeout:g}s."}
+        submit_ready()
+
+def iter_ndjson(results):
+    """Serializes result dicts as NDJSON lines."""
+    for result in results:
+        yield json.dumps(result) + "\n"
+
+# The web endpoint shares one pool per web worker process, created on first use.
+_shared_pool_state = {'pool': None}
+_shared_pool_lock = threading.Lock()
+
+def get_shared_pool():
+    with _shared_pool_lock:
+        pool = _shared_pool_state['pool']
+        # A pool whose worker died cannot take new work; replace it.
+        if pool is None or getattr(pool, '_broken', False):
+            _shared_pool_state['pool'] = create_pool(int(os.environ.get('BATCH_WORKERS', 2)))
+        return _shared_pool_state['pool']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run career analyses for a JSONL file or a directory of resumes.")
+    parser.add_argument('input', help="JSONL file ('-' for stdin) or directory of PDF/DOCX/TXT resumes")
+    parser.add_argument('--output', '-o', help="NDJSON output file (default: stdout)")
+    parser.add_argument('--workers', '-w', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--top-k', type=int, default=10, help="careers to return per item")
+    parser.add_argument('--learning-plan', choices=LEARNING_PLAN_MODES, default=None,
+                        help="courses per career: all matching ones, or a minimal covering set (default: LEARNING_PLAN_MODE)")
+    parser.add_argument('--item-timeout', type=float, default=BATCH_ITEM_TIMEOUT,
+                        help="seconds an item may run before it is reported as failed (default: BATCH_ITEM_TIMEOUT)")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.input):
+        items = iter_directory_items(args.input)
+        source = None
+    else:
+        source = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+        items = iter_jsonl_items(source)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    workers = args.workers or os.cpu_count() or 1
+    failures = 0
+    try:
+        with create_pool(workers) as pool:
+            for result in run_batch(items, pool, top_k=args.top_k, max_in_flight=workers,
+                                  plan_mode=args.learning_plan, item_timeout=args.item_timeout):
+                failures += 'error' in result
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+    finally:
+        if source not in (None, sys.stdin):
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
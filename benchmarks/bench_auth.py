@@ -0,0 +1,144 @@
+"""
+Benchmark for the per-request cost of authentication.
+
+Measures, through Flask's test client against a throwaway SQLite database:
+
+- the Flask-Login user loader, reading the user table on every request
+  (USER_CACHE_TTL=0, the old behaviour) and served from the identity cache;
+- a cheap authenticated request (GET /project_videos) in both modes;
+- the same request while a burst of logins runs on other threads, with bcrypt
+  on the request threads (BCRYPT_WORKERS=0, the old behaviour) and on the
+  bounded bcrypt pool.
+
+Usage:
+    python benchmarks/bench_auth.py
+    python benchmarks/bench_auth.py --login-threads 16 --logins 4 --rounds 10 --output auth.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_pipeline import measure
+
+PASSWORD = 'bench-password'
+
+def summarize(name, variant, timings):
+    timings = sorted(timings)
+    return {
+        'name': name,
+        'variant': variant,
+        'runs': len(timings),
+        'p50_ms': round(statistics.median(timings), 4),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0], 4),
+    }
+
+def create_users(app_module, count, rounds):
+    """Adds users bench-0..bench-N sharing one password hash of the given bcrypt cost."""
+    import bcrypt as bcrypt_module
+    password_hash = bcrypt_module.hashpw(PASSWORD.encode('utf-8'), bcrypt_module.gensalt(rounds)).decode('utf-8')
+    with app_module.app.app_context():
+        users = [app_module.User(username=f"bench-{n}", password_hash=password_hash) for n in range(count)]
+        app_module.db.session.add_all(users)
+        app_module.db.session.commit()
+        return [user.id for user in users]
+
+def login(flask_app, username):
+    client = flask_app.test_client()
+    response = client.post('/login', data={'username': username, 'password': PASSWORD})
+    return client, response.status_code
+
+def bench_user_loader(app_module, user_id, repeat):
+    results = []
+    with app_module.app.app_context():
+        for variant, ttl in (('uncached', 0), ('cached', 300)):
+            app_module.app.config['USER_CACHE_TTL'] = ttl
+            app_module.identity_cache.clear()
+            app_module.load_user(str(user_id))
+            results.append(summarize('load_user', variant, measure(lambda: app_module.load_user(str(user_id)), repeat)))
+    return results
+
+def bench_request(app_module, client, repeat):
+    results = []
+    for variant, ttl in (('uncached', 0), ('cached', 300)):
+        app_module.app.config['USER_CACHE_TTL'] = ttl
+        app_module.identity_cache.clear()
+
+        def request():
+            response = client.get('/project_videos?careers=')
+            assert response.status_code == 200, response.status_code
+
+        results.append(summarize('authenticated_request', variant, measure(request, repeat)))
+    return results
+
+def bench_login_burst(app_module, client, login_threads, logins, workers):
+    """Times cheap authenticated requests while `login_threads` threads each log in `logins` times."""
+    from auth import PasswordHasher
+    app_module.password_hasher = PasswordHasher(app_module.bcrypt, max_workers=workers)
+    app_module.app.config['USER_CACHE_TTL'] = 300
+
+    statuses = []
+    def login_worker(n):
+        for _ in range(logins):
+            statuses.append(login(app_module.app, f"bench-{n + 1}")[1])
+
+    threads = [threading.Thread(target=login_worker, args=(n,)) for n in range(login_threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    timings = []
+    while any(thread.is_alive() for thread in threads):
+        request_started = time.perf_counter()
+        client.get('/project_videos?careers=')
+        timings.append((time.perf_counter() - request_started) * 1000)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    variant = f"bcrypt_workers={workers}" if workers else 'bcrypt_inline'
+    result = summarize('request_during_login_burst', variant, timings)
+    result['logins_per_second'] = round(len(statuses) / elapsed, 2)
+    result['logins_refused'] = sum(1 for status in statuses if status == 429)
+    return [result]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help="timed calls per measurement")
+    parser.add_argument('--login-threads', type=int, default=8, help="threads logging in during the burst")
+    parser.add_argument('--logins', type=int, default=2, help="logins per burst thread")
+    parser.add_argument('--rounds', type=int, default=12, help="bcrypt cost of the benchmark users' passwords")
+    parser.add_argument('--workers', type=int, default=2, help="bcrypt pool size to compare with inline bcrypt")
+    parser.add_argument('-o', '--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bench-auth-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault('YOUTUBE_CACHE_PATH', os.path.join(workdir, 'youtube_cache.db'))
+    import app as app_module
+
+    user_ids = create_users(app_module, args.login_threads + 1, args.rounds)
+    client, status = login(app_module.app, 'bench-0')
+    assert status == 302, status
+
+    results = bench_user_loader(app_module, user_ids[0], args.repeat)
+    results += bench_request(app_module, client, args.repeat)
+    for workers in (0, args.workers):
+        results += bench_login_burst(app_module, client, args.login_threads, args.logins, workers)
+
+    report = {'rounds': args.rounds, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+Benchmarks for the recommendation pipeline on synthetic catalogs.
+
+Covers extract_skills (exact and fuzzy, checked against a brute-force scan), recommend_careers, analyze_skill_gap, recommend_courses,
+batch re-scoring with CareerScoringEngine (checked against recommend_careers)
+and the full /analyze route (through Flask's test client, with YouTube stubbed
+out and a throwaway SQLite database). Catalogs are generated with the given
+number of skills, careers and courses each; resumes come in several lengths.
+
+Usage:
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --sizes 100,10000 --baseline bench.json
+
+With --baseline, every timing is compared against the stored results and the
+run exits with status 1 if any benchmark got slower than --threshold allows.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = (100, 10_000, 100_000)
+RESUME_WORDS = {'short': 80, 'medium': 800, 'long': 8000}
+FILLER_WORDS = (
+    "experience with team projects delivered built designed led managed worked "
+    "on using for the and in a of to years senior junior intern university"
+).split()
+
+def make_catalog(size, seed=0):
+    """Builds a CatalogSnapshot with `size` skills, careers and courses."""
+    from catalog import CatalogSnapshot, _normalize_career, _normalize_course
+
+    rng = random.Random(seed)
+    skills = [f"Skill{i:06d}" for i in range(size)]
+    # A few popular skills appear in many careers, like real catalogs.
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) ** 0.8 for rank in range(size)))
+
+    career_ids, course_ids = set(), set()
+    careers = []
+    for i in range(size):
+        required = set(rng.choices(skills, cum_weights=cum_weights, k=10))
+        careers.append(_normalize_career({
+            'title': f"Career {i}",
+            'description': f"Synthetic career number {i}.",
+            'avg_salary': 50000 + i,
+            'required_skills': sorted(required),
+            'project_ideas': [
+                {'name': f"Project {i}-{j}", 'youtube_url': f"https://www.youtube.com/watch?v={i:09d}{j:02d}"}
+                for j in range(2)
+            ],
+        }, 'technical', career_ids))
+    courses = [
+        _normalize_course({'skill': skills[i], 'title': f"Course {i}", 'provider': 'Bench', 'url': f"https://example.com/{i}"}, course_ids)
+        for i in range(size)
+    ]
+    return CatalogSnapshot(skills, careers, courses, version=f"bench-{size}-{seed}")
+
+def make_resume(catalog, words, seed=0):
+    """Generates resume text of roughly `words` words, about a tenth of them known skills."""
+    rng = random.Random(seed)
+    skills = catalog.skills
+    return " ".join(rng.choice(skills) if rng.random() < 0.1 else rng.choice(FILLER_WORDS) for _ in range(words))
+
+def measure(func, repeat, min_time=0.2):
+    """Calls func repeatedly and returns per-call timings in milliseconds."""
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < repeat or (time.perf_counter() < deadline and len(timings) < repeat * 10):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def summarize(name, size, variant, timings):
+    ordered = sorted(timings)
+    return {
+        'name': name,
+        'size': size,
+        'variant': variant,
+        'runs': len(timings),
+        'mean_ms': statistics.fmean(timings),
+        'p50_ms': ordered[len(ordered) // 2],
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'min_ms': ordered[0],
+    }
+
+def stub_video_details(video_ids, youtube=None):
+    """Local stand-in for youtube_service.get_video_details."""
+    return [{'id': video_id, 'title': f"Video {video_id}", 'view_count': 0, 'thumbnail_url': ''} for video_id in video_ids]
+
+def bench_functions(catalog, size, repeat):
+    from skill_mapper import SkillMatcher, extract_skills
+    from recommender import recommend_careers, analyze_skill_gap, recommend_courses
+
+    results = []
+    start = time.perf_counter()
+    SkillMatcher(catalog.skills)
+    results.append(summarize('build_skill_matcher', size, 'catalog', [(time.perf_counter() - start) * 1000]))
+
+    for variant, words in RESUME_WORDS.items():
+        resume = make_resume(catalog, words)
+        timings = measure(lambda: extract_skills(resume, catalog.skill_matcher), repeat)
+        results.append(summarize('extract_skills', size, variant, timings))
+
+    # Fuzzy lookups are memoized per phrase, so time a fresh matcher's first pass.
+    resume = make_resume(catalog, RESUME_WORDS['medium'])
+    matcher = SkillMatcher(catalog.skills)
+    start = time.perf_counter()
+    matcher.extract(resume, fuzzy=True)
+    results.append(summarize('extract_skills_fuzzy', size, 'medium', [(time.perf_counter() - start) * 1000]))
+
+    user_skills = extract_skills(make_resume(catalog, RESUME_WORDS['medium']), catalog.skill_matcher)
+    timings = measure(lambda: recommend_careers(user_skills, catalog.career_index, top_k=10), repeat)
+    results.append(summarize('recommend_careers', size, 'top10', timings))
+
+    top = recommend_careers(user_skills, catalog.career_index, top_k=10)
+    required = [catalog.career_skill_sets[rec['career']['id']] for rec in top]
+    timings = measure(lambda: [analyze_skill_gap(user_skills, r) for r in required], repeat)
+    results.append(summarize('analyze_skill_gap', size, 'x10', timings))
+
+    gaps = [analyze_skill_gap(user_skills, r) for r in required]
+    timings = measure(lambda: [recommend_courses(gap, catalog.course_index) for gap in gaps], repeat)
+    results.append(summarize('recommend_courses', size, 'x10', timings))
+    return results
+
+def bench_scoring_engine(catalog, size, repeat, users=256, top_k=10):
+    """
+    Times re-scoring a batch of users with CareerScoringEngine against calling
+    recommend_careers once per user, and checks that the engine's Jaccard
+    rankings and scores match recommend_careers exactly.
+    """
+    from recommender import recommend_careers
+    from scoring import CareerScoringEngine
+    from skill_mapper import extract_skills
+
+    start = time.perf_counter()
+    engine = CareerScoringEngine(catalog)
+    results = [summarize('build_scoring_engine', size, 'catalog', [(time.perf_counter() - start) * 1000])]
+
+    skill_lists = [extract_skills(make_resume(catalog, RESUME_WORDS['medium'], seed), catalog.skill_matcher)
+                   for seed in range(users)]
+    # Careers sharing no skill are left out by the engine; min_score drops them here too.
+    expected = [recommend_careers(skills, catalog.career_index, top_k=top_k, min_score=1e-12) for skills in skill_lists]
+    actual = engine.top_k(skill_lists, top_k)
+    for user, (recs, ranked) in enumerate(zip(expected, actual)):
+        got = [(engine.careers[position]['id'], score) for position, score in ranked]
+        want = [(rec['career']['id'], rec['score']) for rec in recs]
+        if got != want:
+            raise AssertionError(f"CareerScoringEngine differs from recommend_careers for user {user}: {got} != {want}")
+
+    timings = measure(lambda: [recommend_careers(skills, catalog.career_index, top_k=top_k) for skills in skill_lists], repeat)
+    results.append(summarize('rescore_users', size, f"recommend_careers_x{users}", timings))
+    timings = measure(lambda: engine.top_k(skill_lists, top_k), repeat)
+    results.append(summarize('rescore_users', size, f"scoring_engine_x{users}", timings))
+    return results
+
+# Fuzzy matching must leave ordinary prose alone and still correct real typos.
+FUZZY_REJECTED = (
+    "I want to reach customers", "worked the night shift", "Six Sigma certified",
+    "The system reacts quickly",
+)
+FUZZY_ACCEPTED = {"Kubernates": "Kubernetes", "Tensorflow2": "TensorFlow", "Machine Lerning": "Machine Learning"}
+
+def check_fuzzy_matcher(phrases=300, seed=0):
+    """
+    Checks fuzzy skill matching on the bundled catalog: the cases above, and the
+    trigram-indexed lookup against a brute-force scan of every term for random
+    misspellings of skills and aliases at several thresholds.
+    """
+    from catalog import load_catalog
+
+    matcher = load_catalog().skill_matcher
+    for text in FUZZY_REJECTED:
+        hits = [m for m in matcher.match(text, fuzzy=True) if m['source'] == 'fuzzy']
+        if hits:
+            raise AssertionError(f"Fuzzy matching accepted prose {text!r}: {hits}")
+    for text, skill in FUZZY_ACCEPTED.items():
+        if skill not in matcher.extract(text, fuzzy=True):
+            raise AssertionError(f"Fuzzy matching did not correct {text!r} to {skill!r}")
+
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    samples = list(FUZZY_REJECTED) + list(FUZZY_ACCEPTED)
+    for _ in range(phrases):
+        chars = list(rng.choice(matcher._terms))
+        for _ in range(rng.randint(1, 3)):
+            position = rng.randrange(len(chars) + 1)
+            edit = rng.choice(('insert', 'delete', 'replace'))
+            if edit == 'insert' or not chars:
+                chars.insert(position, rng.choice(letters))
+            elif position < len(chars):
+                if edit == 'delete':
+                    del chars[position]
+                else:
+                    chars[position] = rng.choice(letters)
+        samples.append(''.join(chars))
+    for threshold in (0.5, 0.6, 0.7, 0.8):
+        for text in samples:
+            for phrase, _ in matcher._fuzzy_phrases(text):
+                indexed = matcher._fuzzy_lookup_uncached(phrase, threshold)
+                scanned = matcher._fuzzy_lookup_scan(phrase, threshold)
+                if indexed != scanned:
+                    raise AssertionError(f"Fuzzy lookup of {phrase!r} at {threshold}: index {indexed} != scan {scanned}")
+
+def bench_route(catalog, size, repeat):
+    """Times POST /analyze end to end against the synthetic catalog."""
+    import catalog as catalog_module
+    import app as app_module
+
+    # Pin the synthetic snapshot and keep the stub in place of YouTube.
+    catalog_module._catalog_state.update(snapshot=catalog, checked_at=float('inf'))
+    app_module.get_video_details = stub_video_details
+    flask_app = app_module.app
+
+    client = flask_app.test_client()
+    client.post('/signup', data={'username': 'bench', 'password': 'bench', 'confirm_password': 'bench'})
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+
+    results = []
+    for variant, words in RESUME_WORDS.items():
+        resumes = [make_resume(catalog, words, seed) for seed in range(8)]
+        counter = iter(range(10 ** 9))
+
+        def analyze():
+            # Rotate resumes so the analysis cache does not answer every call.
+            response = client.post('/analyze', data={'user_input': resumes[next(counter) % len(resumes)]})
+            assert response.status_code == 200, response.status_code
+
+        results.append(summarize('analyze_route', size, variant, measure(analyze, repeat)))
+    return results
+
+def compare(results, baseline, threshold):
+    """Prints the change against a baseline and returns the regressions."""
+    previous = {(r['name'], r['size'], r['variant']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get((result['name'], result['size'], result['variant']))
+        if not old or not old['p50_ms']:
+            continue
+        ratio = result['p50_ms'] / old['p50_ms']
+        flag = ' REGRESSION' if ratio > threshold else ''
+        print(f"{result['name']:>20} {result['size']:>7} {result['variant']:>8}: "
+              f"{old['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms ({ratio:5.2f}x){flag}", file=sys.stderr)
+        if flag:
+            regressions.append(result)
+    return regressions
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated catalog sizes (skills = careers = courses)")
+    parser.add_argument('--repeat', type=int, default=20, help="minimum timed calls per benchmark")
+    parser.add_argument('--skip-route', action='store_true', help="skip the /analyze route benchmark")
+    parser.add_argument('--output', '-o', help="write JSON results here (default: stdout)")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="p50 slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    # Keep the route benchmark away from the real database and the YouTube API.
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault('YOUTUBE_CACHE_PATH', os.path.join(workdir, 'youtube_cache.db'))
+
+    check_fuzzy_matcher()
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        start = time.perf_counter()
+        catalog = make_catalog(size)
+        print(f"catalog size {size}: built in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+        results.extend(bench_functions(catalog, size, args.repeat))
+        results.extend(bench_scoring_engine(catalog, size, args.repeat))
+        if not args.skip_route:
+            results.extend(bench_route(catalog, size, args.repeat))
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Cold-start report for the web app.
+
+Imports app.py in fresh interpreters (as a gunicorn worker does) and reports
+the startup phases recorded by startup.py along with the slowest imports,
+grouped by top-level package, from Python's -X importtime output.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --budget 1.5
+
+Exits with status 1 when the median total startup time is over the budget
+(default: STARTUP_BUDGET_SECONDS, as used by the app itself).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_CODE = "import json, app, startup; print(json.dumps(startup.get_startup_report()))"
+
+def run_once(env):
+    """Starts one interpreter that imports the app; returns (startup report, import times)."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD_CODE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report, parse_importtime(result.stderr)
+
+def parse_importtime(output):
+    """Returns {top-level package: cumulative seconds} for the packages imported on behalf of app.py."""
+    packages, children = {}, []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nesting is shown by two spaces per level, and a module's own imports are
+        # listed before it. Collect the direct imports until their parent shows up.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip().split('.')[0], int(cumulative) / 1e6))
+        elif depth == 0:
+            if name.strip() == 'app':
+                for package, seconds in children:
+                    packages[package] = packages.get(package, 0.0) + seconds
+            children = []
+    return packages
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="cold starts to measure")
+    parser.add_argument('--budget', type=float, default=None, help="startup budget in seconds")
+    parser.add_argument('--top', type=int, default=15, help="packages to list in the import breakdown")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    # Start against a throwaway database, as a fresh deployment would.
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'startup.db')}")
+    env.setdefault('YOUTUBE_CACHE_PATH', os.path.join(workdir, 'youtube_cache.db'))
+
+    reports, imports = [], []
+    for _ in range(args.runs):
+        report, packages = run_once(env)
+        reports.append(report)
+        imports.append(packages)
+
+    budget = args.budget if args.budget is not None else reports[0]['budget_seconds']
+    phase_names = [phase['name'] for phase in reports[0]['phases']]
+    summary = {
+        'runs': args.runs,
+        'budget_seconds': budget,
+        'total_seconds': statistics.median(r['total_seconds'] for r in reports),
+        'phases': {
+            name: statistics.median(next(p['seconds'] for p in r['phases'] if p['name'] == name) for r in reports)
+            for name in phase_names
+        },
+        'imports': dict(sorted(
+            ((name, statistics.median(p.get(name, 0.0) for p in imports)) for name in set().union(*imports)),
+            key=lambda item: -item[1],
+        )[:args.top]),
+    }
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Startup over {args.runs} runs (median): {summary['total_seconds']:.3f}s, budget {budget:.3f}s")
+        for name, seconds in summary['phases'].items():
+            print(f"  {name:<24} {seconds:8.3f}s")
+        print("Slowest imports (cumulative, by top-level package):")
+        for name, seconds in summary['imports'].items():
+            print(f"  {name:<24} {seconds:8.3f}s")
+    return 0 if summary['total_seconds'] <= budget else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
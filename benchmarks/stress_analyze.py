@@ -0,0 +1,145 @@
+"""
+Concurrency stress run for POST /analyze.
+
+Sends many simultaneous /analyze requests from several threads through Flask's
+test client (one logged-in user per thread, YouTube stubbed out, a throwaway
+SQLite database), the way a threaded gunicorn worker serves them. It checks that:
+
+- every request succeeds,
+- each results page matches the page a single thread renders for the same resume,
+- the shared catalog is unchanged afterwards,
+- every analysis is saved.
+
+Usage:
+    python benchmarks/stress_analyze.py
+    python benchmarks/stress_analyze.py --threads 32 --requests 2000 --catalog-size 1000
+
+Prints throughput and latency for the single-threaded reference pass and the
+concurrent pass, and exits with status 1 if any check fails.
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_pipeline import make_catalog, make_resume, stub_video_details
+
+def catalog_digest(catalog):
+    from catalog import thaw
+    return hashlib.sha1(json.dumps([thaw(catalog.careers), thaw(catalog.courses)], sort_keys=True).encode('utf-8')).hexdigest()
+
+def results_section(body):
+    """The results page without the site chrome, which shows the logged-in user."""
+    return body.split(b'class="results-container"', 1)[-1]
+
+def login(flask_app, username):
+    client = flask_app.test_client()
+    client.post('/signup', data={'username': username, 'password': username, 'confirm_password': username})
+    client.post('/login', data={'username': username, 'password': username})
+    return client
+
+def latency_summary(name, latencies, elapsed):
+    return {
+        'name': name,
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(statistics.quantiles(latencies, n=20)[-1], 3) if len(latencies) > 1 else latencies[0],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help="concurrent clients")
+    parser.add_argument('--requests', type=int, default=800, help="total /analyze requests in the concurrent pass")
+    parser.add_argument('--resumes', type=int, default=24, help="distinct resumes to rotate through")
+    parser.add_argument('--words', type=int, default=400, help="words per resume")
+    parser.add_argument('--catalog-size', type=int, default=0,
+                        help="use a synthetic catalog of this size instead of the bundled one")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='stress-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'stress.db')}")
+    os.environ.setdefault('YOUTUBE_CACHE_PATH', os.path.join(workdir, 'youtube_cache.db'))
+
+    import catalog as catalog_module
+    import app as app_module
+
+    if args.catalog_size:
+        catalog_module._catalog_state.update(snapshot=make_catalog(args.catalog_size), checked_at=float('inf'))
+    catalog = catalog_module.get_catalog()
+    app_module.get_video_details = stub_video_details
+    flask_app = app_module.app
+    digest_before = catalog_digest(catalog)
+
+    resumes = [make_resume(catalog, args.words, seed) for seed in range(args.resumes)]
+
+    # Reference pass: one thread, one request per resume.
+    client = login(flask_app, 'stress-reference')
+    expected, latencies = [], []
+    started = time.perf_counter()
+    for resume in resumes:
+        request_started = time.perf_counter()
+        response = client.post('/analyze', data={'user_input': resume})
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        assert response.status_code == 200, response.status_code
+        expected.append(results_section(response.data))
+    reference = latency_summary('sequential', latencies, time.perf_counter() - started)
+
+    # Concurrent pass: all threads start together and share the request counter.
+    clients = [login(flask_app, f"stress-{n}") for n in range(args.threads)]
+    counter = iter(range(args.requests))
+    counter_lock = threading.Lock()
+    barrier = threading.Barrier(args.threads)
+    failures, latencies = [], []
+
+    def worker(client):
+        barrier.wait()
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            resume_number = n % len(resumes)
+            request_started = time.perf_counter()
+            try:
+                response = client.post('/analyze', data={'user_input': resumes[resume_number]})
+            except Exception as e:
+                failures.append(f"request {n}: {e!r}")
+                continue
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            if response.status_code != 200:
+                failures.append(f"request {n}: status {response.status_code}")
+            elif results_section(response.data) != expected[resume_number]:
+                failures.append(f"request {n}: results differ from the sequential run for resume {resume_number}")
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    concurrent = latency_summary(f"{args.threads} threads", latencies, time.perf_counter() - started)
+
+    if catalog_digest(catalog) != digest_before:
+        failures.append("the shared catalog was modified")
+    app_module.analysis_writer.flush(timeout=30.0)
+    with flask_app.app_context():
+        saved = app_module.Analysis.query.count()
+    if saved != len(resumes) + args.requests:
+        failures.append(f"{saved} analyses saved, expected {len(resumes) + args.requests}")
+
+    print(json.dumps({'results': [reference, concurrent], 'failures': len(failures)}, indent=2))
+    for failure in failures[:20]:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
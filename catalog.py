@@ -0,0 +1,235 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from types import MappingProxyType
+
+from data_loader import load_json_data, get_data_path
+from skill_mapper import SkillMatcher
+from recommender import CareerIndex, CourseIndex
+from youtube_service import extract_video_id_from_url
+
+# The JSON files that make up the catalog. Non-technical careers are optional and
+# are recommended alongside the technical ones. Skill aliases map a skill name to
+# other names it is commonly written as (e.g. "Postgres" for "PostgreSQL").
+CATALOG_FILES = {
+    'skills': 'skills.json',
+    'careers': 'careers.json',
+    'non_technical_careers': 'non_technical_careers.json',
+    'courses': 'courses.json',
+    'skill_aliases': 'skill_aliases.json',
+}
+
+# Sections that may be absent, and what stands in for them. Every other file must
+# exist and hold valid JSON of the expected type, or the load fails.
+OPTIONAL_CATALOG_FILES = {'non_technical_careers': [], 'skill_aliases': {}}
+CATALOG_FILE_TYPES = {'skill_aliases': dict}
+
+class CatalogLoadError(Exception):
+    """Raised when a catalog file is missing, not valid JSON or has the wrong shape."""
+    pass
+
+# How often (in seconds) get_catalog() looks at file modification times.
+CATALOG_CHECK_INTERVAL = float(os.environ.get('CATALOG_CHECK_INTERVAL', 2.0))
+
+def freeze(value):
+    """Returns a read-only deep copy of JSON-like data: dicts become mappingproxies, lists tuples."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def thaw(value):
+    """Returns a plain dict and list copy of frozen data, e.g. to encode it as JSON."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+def slugify(text):
+    """Turns a title into a stable, URL-safe identifier."""
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+def _unique_id(base, taken):
+    candidate, suffix = base, 2
+    while candidate in taken:
+        candidate, suffix = f"{base}-{suffix}", suffix + 1
+    taken.add(candidate)
+    return candidate
+
+def _normalize_career(career, category, taken_ids):
+    """Returns a copy of a career entry with an ID, a category and pre-parsed project videos."""
+    project_ideas = []
+    for p in career.get('project_ideas', []):
+        # non_technical_careers.json names projects with `title` rather than `name`.
+        name = p.get('name') or p.get('title', '')
+        project_ideas.append({**p, 'name': name, 'video_id': extract_video_id_from_url(p.get('youtube_url', ''))})
+    return {
+        **career,
+        'id': _unique_id(slugify(career.get('title', 'career')), taken_ids),
+        'category': category,
+        'required_skills': list(career.get('required_skills', [])),
+        'project_ideas': project_ideas,
+    }
+
+def _normalize_course(course, taken_ids):
+    return {**course, 'id': _unique_id(slugify(course.get('title', 'course')), taken_ids)}
+
+def normalize_entries(careers, courses):
+    """
+    Normalizes career and course entries the way load_catalog() does, giving each
+    a unique ID. Careers keep their `category`, defaulting to 'technical'.
+    """
+    career_ids, course_ids = set(), set()
+    return ([_normalize_career(c, c.get('category', 'technical'), career_ids) for c in careers],
+            [_normalize_course(c, course_ids) for c in courses])
+
+class CatalogSnapshot:
+    """
+    One consistent, precompiled view of the catalog files.
+
+    A snapshot is built once and never modified; reloading the catalog builds a
+    new snapshot and swaps it in. Besides the normalized data it carries
+    everything requests would otherwise recompute: the skill matcher, the career
+    and course indexes, lowercased skill sets and parsed project video IDs.
+
+    Careers and courses are frozen (see freeze()), so one snapshot can be shared
+    by every thread of a worker: requests add their own data to copies, such as
+    the career views built by pipeline.attach_project_details().
+    """
+
+    def __init__(self, skills, careers, courses, version, mtimes=None, skill_aliases=None):
+        self.skills = tuple(skills)
+        self.careers = freeze(careers)
+        self.courses = freeze(courses)
+        self.version = version
+        self.mtimes = mtimes or {}
+
+        # Normalized skill IDs are lowercased names; map them back to display names.
+        self.skill_ids = MappingProxyType({skill.lower(): skill for skill in self.skills})
+        self.skill_aliases = skill_aliases or {}
+        self.skill_matcher = SkillMatcher(self.skills, aliases=self.skill_aliases)
+        self.career_index = CareerIndex(self.careers)
+        self.course_index = CourseIndex(self.courses)
+
+        self.careers_by_id = MappingProxyType({career['id']: career for career in self.careers})
+        self.courses_by_id = MappingProxyType({course['id']: course for course in self.courses})
+        self.career_skill_sets = MappingProxyType({
+            career['id']: frozenset(skill.lower() for skill in career['required_skills'])
+            for career in self.careers
+        })
+        self.career_video_ids = MappingProxyType({
+            career['id']: tuple(dict.fromkeys(p['video_id'] for p in career['project_ideas'] if p['video_id']))
+            for career in self.careers
+        })
+
+    @property
+    def is_loaded(self):
+        """True when the files needed for an analysis were all loaded."""
+        return bool(self.skills and self.careers and self.courses)
+
+    def project_video_ids(self, careers):
+        """Returns the unique project video IDs across the given careers, in order."""
+        video_ids = {}
+        for career in careers:
+            video_ids.update(dict.fromkeys(self.career_video_ids.get(career['id'], ())))
+        return list(video_ids)
+
+def _file_mtimes():
+    mtimes = {}
+    for key, filename in CATALOG_FILES.items():
+        try:
+            mtimes[key] = os.path.getmtime(get_data_path(filename))
+        except OSError:
+            mtimes[key] = None
+    return mtimes
+
+def _load_catalog_file(key, filename):
+    try:
+        data = load_json_data(filename, strict=True)
+    except FileNotFoundError:
+        if key in OPTIONAL_CATALOG_FILES:
+            return OPTIONAL_CATALOG_FILES[key]
+        raise CatalogLoadError(f"{filename} is missing.")
+    except (ValueError, OSError) as e:
+        # ValueError covers JSONDecodeError and undecodable bytes, e.g. a half-written file.
+        raise CatalogLoadError(f"{filename} could not be read: {e}")
+
+    expected_type = CATALOG_FILE_TYPES.get(key, list)
+    if not isinstance(data, expected_type):
+        raise CatalogLoadError(f"{filename} must contain a JSON {'object' if expected_type is dict else 'array'}.")
+    if not data and key not in OPTIONAL_CATALOG_FILES:
+        raise CatalogLoadError(f"{filename} is empty.")
+    return data
+
+def load_catalog():
+    """
+    Loads all catalog files and compiles them into a new CatalogSnapshot.
+    Raises CatalogLoadError if a required file is missing or any file is invalid.
+    """
+    mtimes = _file_mtimes()
+    raw = {key: _load_catalog_file(key, filename) for key, filename in CATALOG_FILES.items()}
+
+    # The version is a content hash, so every worker derives the same value for the
+    # same files regardless of when it loaded them.
+    digest = hashlib.sha1(json.dumps(raw, sort_keys=True).encode('utf-8')).hexdigest()
+
+    career_ids, course_ids = set(), set()
+    careers = [_normalize_career(c, 'technical', career_ids) for c in raw['careers']]
+    careers += [_normalize_career(c, 'non_technical', career_ids) for c in raw['non_technical_careers']]
+    courses = [_normalize_course(c, course_ids) for c in raw['courses']]
+
+    return CatalogSnapshot(raw['skills'], careers, courses, version=digest[:12], mtimes=mtimes,
+                           skill_aliases=raw['skill_aliases'])
+
+# The current snapshot. Readers grab the reference once per request and keep
+# using it, so a reload never changes the catalog under a running request.
+_catalog_state = {'snapshot': None, 'checked_at': 0.0}
+_catalog_lock = threading.Lock()
+# Called as listener(old_snapshot, new_snapshot) after a reload swaps in a new version.
+_reload_listeners = []
+
+def add_reload_listener(listener):
+    """Registers a function to run whenever a changed catalog is swapped in."""
+    _reload_listeners.append(listener)
+
+def get_catalog():
+    """
+    Returns the current catalog snapshot, reloading it when a catalog file changed.
+    File modification times are checked at most every CATALOG_CHECK_INTERVAL seconds.
+    If a reload fails the current snapshot stays in place; if the first load
+    fails, the error is raised.
+    """
+    snapshot = _catalog_state['snapshot']
+    now = time.monotonic()
+    if snapshot is not None and now - _catalog_state['checked_at'] < CATALOG_CHECK_INTERVAL:
+        return snapshot
+
+    with _catalog_lock:
+        snapshot = _catalog_state['snapshot']
+        if snapshot is not None and now - _catalog_state['checked_at'] < CATALOG_CHECK_INTERVAL:
+            return snapshot
+        _catalog_state['checked_at'] = now
+        if snapshot is None or _file_mtimes() != snapshot.mtimes:
+            try:
+                new_snapshot = load_catalog()
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                logging.error(f"Reloading the catalog failed; keeping the current version: {e}")
+                return snapshot
+            old_snapshot = snapshot
+            _catalog_state['snapshot'] = snapshot = new_snapshot
+            if old_snapshot is not None:
+                logging.info(f"Catalog reloaded: version {old_snapshot.version} -> {new_snapshot.version}")
+                for listener in _reload_listeners:
+                    try:
+                        listener(old_snapshot, new_snapshot)
+                    except Exception as e:
+                        logging.error(f"Catalog reload listener failed: {e}")
+        return snapshot
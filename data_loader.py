@@ -1,11 +1,21 @@
 import json
 import os
 
-def load_json_data(filename):
-    """Loads data from a JSON file."""
-    # Construct the full path to the data file
+def get_data_path(filename):
+    """Returns the absolute path of a data file shipped next to this module."""
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(base_dir, filename)
+    return os.path.join(base_dir, filename)
+
+def load_json_data(filename, strict=False):
+    """
+    Loads data from a JSON file. Returns None if it is missing or not valid JSON,
+    or with `strict=True` lets FileNotFoundError / json.JSONDecodeError propagate.
+    """
+    # Construct the full path to the data file
+    file_path = get_data_path(filename)
+    if strict:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
     try:
         with open(file_path, 'r') as f:
             return json.load(f)
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+import metrics
+from ttl_cache import TTLCache
+
+def _as_markup(fragment):
+    if isinstance(fragment, dict):
+        return {name: Markup(piece) for name, piece in fragment.items()}
+    return Markup(fragment)
+
+def _weigh(fragment):
+    if isinstance(fragment, dict):
+        return sum(len(piece) for piece in fragment.values())
+    return len(fragment)
+
+class FragmentCache:
+    """
+    Pre-rendered HTML fragments that depend only on catalog data, such as the
+    static parts of a career card. Fragments are kept per catalog version, so a
+    reload never serves markup built from the previous catalog, and
+    drop_version() discards a version's fragments all at once.
+
+    At most `max_versions` versions are kept, evicting the least recently used;
+    the version returned by `current_version()` is never evicted, so pages of
+    old analyses (rendered from archived catalogs) cannot push out the fragments
+    every new analysis uses.
+    """
+
+    def __init__(self, maxsize=4096, maxbytes=16 * 1024 * 1024, max_versions=2, current_version=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.max_versions = max_versions
+        self.current_version = current_version or (lambda: None)
+        # Least recently used version first.
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _version_cache(self, version):
+        with self._lock:
+            cache = self._versions.get(version)
+            if cache is not None:
+                self._versions.move_to_end(version)
+                return cache
+        # Outside the lock: looking up the catalog may reload it, which calls drop_version().
+        current = self.current_version()
+        with self._lock:
+            cache = self._versions.get(version)
+            if cache is None:
+                while len(self._versions) >= self.max_versions:
+                    evictable = next((v for v in self._versions if v != current), None)
+                    if evictable is None:
+                        break
+                    del self._versions[evictable]
+                cache = self._versions[version] = TTLCache(maxsize=self.maxsize, weigher=_weigh, maxweight=self.maxbytes)
+            return cache
+
+    def get_or_render(self, version, key, render):
+        """
+        Returns the fragment cached under (version, key), calling render() to build it on a miss.
+        render() returns markup, or a dict of named markup pieces.
+        Without a catalog version (e.g. analyses saved by older releases) nothing is cached.
+        """
+        if version is None:
+            return _as_markup(render())
+        cache = self._version_cache(version)
+        fragment = cache.get(key)
+        with self._lock:
+            self.stats['hits' if fragment is not None else 'misses'] += 1
+        metrics.inc('fragment_cache_lookups_total', result='hit' if fragment is not None else 'miss')
+        if fragment is None:
+            fragment = _as_markup(render())
+            cache.set(key, fragment)
+        return fragment
+
+    def drop_version(self, version):
+        with self._lock:
+            self._versions.pop(version, None)
+
+    def get_stats(self):
+        """Hits, misses and cached versions for this process; /metrics sums lookups across workers."""
+        with self._lock:
+            return {**self.stats, 'versions': list(self._versions), 'entries': sum(len(c) for c in self._versions.values())}
+
+def career_card_key(career, deferred):
+    """
+    Cache key for the static parts of a career card. Besides the career it covers
+    the project video details, which change as they are fetched.
+    """
+    return ('career', career.get('id'), bool(deferred), tuple(
+        (p.get('video_id'), p.get('name'), (p.get('details') or {}).get('title'), (p.get('details') or {}).get('thumbnail_url'))
+        for p in career.get('project_ideas_detailed') or ()
+    ))
+
+def courses_key(courses):
+    return ('courses',) + tuple(course.get('id') or course.get('url') for course in courses)
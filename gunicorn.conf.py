@@ -0,0 +1,7 @@
+# gunicorn reads this file from the working directory on start (see app.yaml).
+import metrics
+
+def on_starting(server):
+    # Chosen once in the master, so every worker (and the parse and batch workers
+    # they start) writes its metrics snapshots to the same directory.
+    metrics.export_default_directory()
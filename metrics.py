@@ -0,0 +1,357 @@
+"""
+Lightweight in-process metrics: counters and latency histograms, exported in
+the Prometheus text format.
+
+Every gunicorn worker keeps its own metrics, and also writes a snapshot of them
+to `METRICS_DIR/<pid>-<start time>.json` every METRICS_FLUSH_INTERVAL seconds.
+render_metrics() sums the snapshots of all workers, so whichever worker answers
+/metrics reports the totals. When a scrape finds the snapshot of a process that
+has exited (a recycled gunicorn worker, a finished batch or parse worker), it
+folds it into `METRICS_DIR/retired.json` and deletes it, so counters never go
+backwards and the number of files read per scrape stays bounded.
+
+The server picks a default METRICS_DIR when it starts (gunicorn.conf.py in the
+gunicorn master, or app.py when run directly) by calling
+export_default_directory(): a directory under the system temporary directory
+(the only writable place on App Engine) named after the deployment, i.e. the
+App Engine deployment ID or else the server's PID, so each deploy or restart
+starts from zero. Other importers (flask commands, benchmarks, batch runs) keep
+their metrics in process unless METRICS_DIR is set. Set METRICS_DIR to an empty
+string to keep metrics per worker.
+
+With METRICS_ENABLED=0, timer() returns a shared no-op context manager and
+inc()/observe() return immediately.
+"""
+import atexit
+import bisect
+import functools
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots of exited processes are kept instead of folded.
+    fcntl = None
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+PREFIX = 'career_advisor_'
+
+# Latency buckets, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Every metric must be declared here: name -> (type, help text).
+METRICS = {
+    'analyze_request_seconds': ('histogram', "Total time spent handling /analyze."),
+    'analyze_stage_seconds': ('histogram', "Time spent in each stage of /analyze."),
+    'youtube_request_seconds': ('histogram', "Latency of YouTube Data API calls."),
+    'youtube_requests_total': ('counter', "YouTube Data API calls made."),
+    'youtube_quota_units_total': ('counter', "YouTube Data API quota units consumed (estimated)."),
+    'youtube_errors_total': ('counter', "YouTube Data API calls that failed."),
+    'write_behind_batch_seconds': ('histogram', "Time spent writing one batch from a write-behind queue."),
+    'write_behind_rows_total': ('counter', "Rows handled by write-behind queues, by result."),
+    'resume_parse_seconds': ('histogram', "Time spent parsing an uploaded resume, by format and result."),
+    'resume_parse_rejected_total': ('counter', "Resume parses refused because every parse worker was busy."),
+    'analysis_cache_lookups_total': ('counter', "Analysis cache lookups, by result (hit or miss)."),
+    'fragment_cache_lookups_total': ('counter', "Career card fragment cache lookups, by result (hit or miss)."),
+    'search_cache_lookups_total': ('counter', "Video search cache lookups, by result (hit, miss or coalesced)."),
+    'startup_seconds': ('histogram', "Time each worker took to start."),
+    'startup_phase_seconds': ('histogram', "Time each worker spent in each startup phase."),
+    'first_use_seconds': ('histogram', "Time spent on initialization deferred to first use, by what was initialized."),
+    'password_hash_seconds': ('histogram', "Time spent hashing or checking a password, including waiting for the bcrypt pool."),
+    'password_hash_rejected_total': ('counter', "Password hashes and checks refused, by reason."),
+}
+
+def _default_directory():
+    deployment = os.environ.get('GAE_DEPLOYMENT_ID') or os.environ.get('GAE_VERSION') or f"pid-{os.getpid()}"
+    return os.path.join(tempfile.gettempdir(), f"career-advisor-metrics-{deployment}")
+
+def export_default_directory():
+    """
+    Sets METRICS_DIR to the default directory unless it is already set. Call it once
+    from the server process before workers start; it is exported so they, and the
+    parse and batch workers they start, all report to the same place.
+    """
+    if 'METRICS_DIR' not in os.environ:
+        os.environ['METRICS_DIR'] = _default_directory()
+
+_state = {
+    'enabled': os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no'),
+    # None until configure() is called: METRICS_DIR is then read on each use, so a
+    # server can export it after this module was imported.
+    'directory': None,
+    'flush_interval': float(os.environ.get('METRICS_FLUSH_INTERVAL', 5.0)),
+    'writer_pid': None,
+}
+_counters = {}
+# (name, labels) -> [bucket counts..., +Inf count], [sum]
+_histograms = {}
+_lock = threading.Lock()
+_NOOP = nullcontext()
+
+def is_enabled():
+    return _state['enabled']
+
+def configure(enabled=None, directory=None):
+    """Overrides the environment settings, e.g. for benchmarks."""
+    if enabled is not None:
+        _state['enabled'] = enabled
+    if directory is not None:
+        _state['directory'] = directory
+
+def _directory():
+    """The snapshot directory, or None to keep metrics in this process only."""
+    directory = _state['directory']
+    if directory is None:
+        directory = os.environ.get('METRICS_DIR')
+    return directory or None
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    """Adds `amount` to a counter."""
+    if not _state['enabled']:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _ensure_writer()
+
+def observe(name, seconds, **labels):
+    """Records one observation in a histogram."""
+    if not _state['enabled']:
+        return
+    key = (name, _label_key(labels))
+    index = bisect.bisect_left(DEFAULT_BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = ([0] * (len(DEFAULT_BUCKETS) + 1), [0.0])
+        histogram[0][index] += 1
+        histogram[1][0] += seconds
+    _ensure_writer()
+
+class _Timer:
+    __slots__ = ('name', 'labels', 'started')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+def timer(name, **labels):
+    """Context manager that records the duration of its block in a histogram."""
+    if not _state['enabled']:
+        return _NOOP
+    return _Timer(name, labels)
+
+def timed(name, **labels):
+    """Decorator form of timer()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# --- Cross-worker snapshots ---
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, list(labels), list(counts), total[0]] for (name, labels), (counts, total) in _histograms.items()],
+        }
+
+def _snapshot_path():
+    return os.path.join(_directory(), f"{os.getpid()}-{_state['started_at']}.json")
+
+def write_snapshot():
+    """Writes this process's metrics to METRICS_DIR, replacing its previous snapshot."""
+    if not _directory():
+        return
+    _write_json(_snapshot_path(), _snapshot())
+
+def _write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _writer_loop():
+    while True:
+        time.sleep(_state['flush_interval'])
+        try:
+            write_snapshot()
+        except OSError as e:
+            logging.warning(f"Could not write metrics snapshot: {e}")
+
+def _ensure_writer():
+    """Starts the snapshot writer once per process (again after a fork)."""
+    if _state['writer_pid'] == os.getpid() or not _directory():
+        return
+    with _lock:
+        if _state['writer_pid'] == os.getpid():
+            return
+        _state['writer_pid'] = os.getpid()
+        _state['started_at'] = int(time.time() * 1000)
+    os.makedirs(_directory(), exist_ok=True)
+    threading.Thread(target=_writer_loop, daemon=True).start()
+
+def _reset_after_fork():
+    # A forked worker must not report its parent's numbers a second time.
+    global _lock
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+
+def _final_snapshot():
+    if _state['writer_pid'] == os.getpid():
+        try:
+            write_snapshot()
+        except OSError:
+            pass
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(_final_snapshot)
+
+# Totals of processes that have exited, and the lock held while folding into them.
+_RETIRED_FILE = 'retired.json'
+_RETIRED_LOCK_FILE = 'retired.lock'
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _merge(snapshots):
+    """Returns (counters, histograms) summed over snapshots."""
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return counters, histograms
+
+def _fold_exited(directory, paths, retired):
+    """
+    Adds the snapshots of exited processes to the retired totals and deletes them.
+    retired.json lists the snapshots being folded in until they are gone, so a
+    snapshot left behind by an interrupted fold is deleted, not counted twice.
+    """
+    folded = set(retired['folded'])
+    snapshots = [_read_snapshot(path) for path in paths if os.path.basename(path) not in folded]
+    counters, histograms = _merge([retired] + [s for s in snapshots if s])
+    retired = {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), counts, total] for (name, labels), (counts, total) in histograms.items()],
+        'folded': sorted(folded.union(os.path.basename(path) for path in paths)),
+    }
+    retired_path = os.path.join(directory, _RETIRED_FILE)
+    _write_json(retired_path, retired)
+    for path in paths:
+        os.remove(path)
+    retired['folded'] = []
+    _write_json(retired_path, retired)
+    return retired
+
+def _read_all(directory):
+    """Reads the live snapshots and the retired totals, folding in those of exited processes."""
+    retired = _read_snapshot(os.path.join(directory, _RETIRED_FILE)) or {'counters': [], 'histograms': [], 'folded': []}
+    snapshots, exited = [], []
+    for path in glob.glob(os.path.join(directory, '*-*.json')):
+        if os.path.basename(path) in retired['folded']:
+            # Already counted in retired; left behind by an interrupted fold.
+            exited.append(path)
+            continue
+        pid = int(os.path.basename(path).split('-', 1)[0])
+        if fcntl is not None and pid != os.getpid() and not _is_running(pid):
+            exited.append(path)
+            continue
+        snapshot = _read_snapshot(path)
+        if snapshot is not None:
+            snapshots.append(snapshot)
+
+    if exited:
+        try:
+            retired = _fold_exited(directory, exited, retired)
+        except OSError as e:
+            logging.warning(f"Could not fold metrics of exited processes: {e}")
+            unfolded = [path for path in exited if os.path.basename(path) not in retired['folded']]
+            return _merge(snapshots + [retired] + list(filter(None, map(_read_snapshot, unfolded))))
+    return _merge(snapshots + [retired])
+
+def _collect():
+    """Returns (counters, histograms) summed over every worker's snapshot and the retired totals."""
+    directory = _directory()
+    if not directory:
+        return _merge([_snapshot()])
+
+    _ensure_writer()
+    write_snapshot()
+    if fcntl is None:
+        return _read_all(directory)
+    # One scrape at a time, so none sees a snapshot both on its own and in retired.json.
+    with open(os.path.join(directory, _RETIRED_LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _read_all(directory)
+
+# --- Prometheus text format ---
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+def render_metrics():
+    """Returns all metrics, summed across workers, in the Prometheus text exposition format."""
+    counters, histograms = _collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        full_name = PREFIX + name
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {kind}")
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{full_name}{_format_labels(labels)} {value}")
+        else:
+            for (metric, labels), (counts, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(DEFAULT_BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
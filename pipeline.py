@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+
+import metrics
+from recommender import recommend_careers, analyze_skill_gap, recommend_courses
+from ttl_cache import TTLCache
+
+# Recommendations are a pure function of (catalog version, skill set), so they are
+# memoized. Entries hold only career and course IDs, scores and skill gaps: every
+# hit rebuilds fresh recommendation dicts around the read-only catalog objects,
+# and the cache is bounded by the approximate encoded size of the entries.
+ANALYSIS_CACHE_MAX_BYTES = int(os.environ.get('ANALYSIS_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 4096))
+
+def _entry_size(entry):
+    return sum(len(career_id) + 24 + sum(len(skill) + 3 for skill in skill_gap) + sum(len(c) + 3 for c in course_ids)
+               for career_id, score, skill_gap, course_ids in entry)
+
+# Courses listed for each career: 'all' courses teaching a gap skill, in catalog
+# order, or a 'minimal' learning plan, the smallest greedy set covering the gap.
+LEARNING_PLAN_MODES = ('all', 'minimal')
+LEARNING_PLAN_MODE = os.environ.get('LEARNING_PLAN_MODE', 'all')
+if LEARNING_PLAN_MODE not in LEARNING_PLAN_MODES:
+    logging.warning(f"Unknown LEARNING_PLAN_MODE {LEARNING_PLAN_MODE!r}; using 'all'.")
+    LEARNING_PLAN_MODE = 'all'
+
+_analysis_cache = TTLCache(maxsize=ANALYSIS_CACHE_MAX_ENTRIES, weigher=_entry_size, maxweight=ANALYSIS_CACHE_MAX_BYTES)
+_analysis_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+def build_recommendations(user_skills, catalog, top_k=None, plan_mode='all'):
+    """
+    Ranks careers for a set of skills and adds the skill gap and course
+    recommendations to each, as selected by `plan_mode` (see LEARNING_PLAN_MODES).
+    Project video details are not included. Careers and courses are the
+    catalog's read-only objects.
+    """
+    career_recommendations = recommend_careers(user_skills, catalog.career_index, top_k=top_k)
+
+    # For EACH recommendation, perform skill gap analysis and recommend courses.
+    for rec in career_recommendations:
+        required_skills = catalog.career_skill_sets[rec['career']['id']]
+        rec['skill_gap'] = analyze_skill_gap(user_skills, required_skills)
+        rec['course_recommendations'] = recommend_courses(rec['skill_gap'], catalog.course_index,
+                                                          minimal=plan_mode == 'minimal')
+    return career_recommendations
+
+def get_recommendations(user_skills, catalog, top_k=None, plan_mode=None):
+    """
+    Returns build_recommendations() for the given skills, served from the analysis
+    cache when the same skill set was seen before under the same catalog version.
+    `plan_mode` defaults to LEARNING_PLAN_MODE.
+    The recommendation dicts and their lists are new for every call and may be
+    modified; the careers and courses in them are shared and read-only.
+    """
+    plan_mode = plan_mode or LEARNING_PLAN_MODE
+    if plan_mode not in LEARNING_PLAN_MODES:
+        raise ValueError(f"Unknown learning plan mode: {plan_mode}")
+    key = (catalog.version, top_k, plan_mode, frozenset(skill.lower() for skill in user_skills))
+
+    entry = _analysis_cache.get(key)
+    with _stats_lock:
+        _analysis_stats['hits' if entry is not None else 'misses'] += 1
+    metrics.inc('analysis_cache_lookups_total', result='hit' if entry is not None else 'miss')
+    if entry is None:
+        entry = tuple(
+            (rec['career']['id'], rec['score'], tuple(rec['skill_gap']),
+             tuple(course['id'] for course in rec['course_recommendations']))
+            for rec in build_recommendations(user_skills, catalog, top_k, plan_mode)
+        )
+        _analysis_cache.set(key, entry)
+
+    return [
+        {
+            'career': catalog.careers_by_id[career_id],
+            'score': score,
+            'skill_gap': list(skill_gap),
+            'course_recommendations': [catalog.courses_by_id[course_id] for course_id in course_ids],
+        }
+        for career_id, score, skill_gap, course_ids in entry
+    ]
+
+def get_analysis_cache_stats():
+    """
+    Returns hits, misses, hit rate and size of the analysis cache for this process.
+    /metrics reports the lookups summed across workers.
+    """
+    with _stats_lock:
+        stats = dict(_analysis_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    stats['entries'] = len(_analysis_cache)
+    stats['bytes'] = _analysis_cache.weight
+    return stats
+
+def attach_project_details(career_recommendations, details_map):
+    """
+    Replaces each recommended career with a per-request view of it that adds the
+    project ideas with their fetched video details. The catalog's careers are
+    shared between requests and never modified.
+    """
+    for rec in career_recommendations:
+        career = rec['career']
+        # Preserve the original order of project ideas from the catalog.
+        rec['career'] = {**career, 'project_ideas_detailed': [
+            {**p, 'details': details_map.get(p['video_id'])}
+            for p in career.get('project_ideas', [])
+        ]}
+    return career_recommendations
@@ -1,4 +1,6 @@
-import math
+import heapq
+
+from ttl_cache import built_from_last
 
 def calculate_jaccard_similarity(set1, set2):
     """Calculates the Jaccard similarity between two sets."""
@@ -10,41 +12,158 @@ def calculate_jaccard_similarity(set1, set2):
     
     return intersection / union if union != 0 else 0.0
 
-def recommend_careers(user_skills, careers_data):
+class CareerIndex:
+    """
+    A precomputed skill -> career posting-list index over a career catalog.
+    Build it once per catalog load; scoring a user then only touches careers
+    that share at least one skill with them.
+    """
+
+    def __init__(self, careers_data):
+        self.careers = list(careers_data)
+        self.skill_set_sizes = []
+        self.postings = {}
+
+        for position, career in enumerate(self.careers):
+            required_skills_set = set(skill.lower() for skill in career.get('required_skills', []))
+            self.skill_set_sizes.append(len(required_skills_set))
+            for skill in required_skills_set:
+                self.postings.setdefault(skill, []).append(position)
+
+    def score(self, user_skills_set):
+        """Returns {career position: Jaccard score} for careers sharing a skill with the user."""
+        intersections = {}
+        for skill in user_skills_set:
+            for position in self.postings.get(skill, ()):
+                intersections[position] = intersections.get(position, 0) + 1
+
+        user_size = len(user_skills_set)
+        return {
+            position: intersection / (user_size + self.skill_set_sizes[position] - intersection)
+            for position, intersection in intersections.items()
+        }
+
+# Returns the CareerIndex for a careers list (or a prebuilt index), reusing the last one built.
+get_career_index = built_from_last(CareerIndex)
+
+def recommend_careers(user_skills, careers_data, top_k=None, min_score=None):
     """
-    Recommends careers based on skill similarity and returns all matches above a threshold.
-    Recommends careers based on skill similarity and returns all available careers, ranked by score.
+    Recommends careers based on skill similarity and returns them ranked by score.
+    By default every career is returned; `top_k` bounds the result size through a
+    heap and `min_score` drops weaker matches (a positive value also skips careers
+    that share no skills with the user). `careers_data` may be a prebuilt CareerIndex.
     """
+    index = get_career_index(careers_data)
     user_skills_set = set(skill.lower() for skill in user_skills)
-    recommendations = []
+    scores = index.score(user_skills_set)
 
-    for career in careers_data:
-        required_skills_set = set(skill.lower() for skill in career.get('required_skills', []))
+    if min_score is not None:
+        scores = {position: score for position, score in scores.items() if score >= min_score}
 
-        score = calculate_jaccard_similarity(user_skills_set, required_skills_set)
+    # Ties keep catalog order, matching a stable sort on score.
+    ranking_key = lambda position: (-scores[position], position)
+    if top_k is None:
+        ranked = sorted(scores, key=ranking_key)
+    else:
+        ranked = heapq.nsmallest(top_k, scores, key=ranking_key)
 
-        recommendations.append({
-            'career': career,
-            'score': score
-        })
+    # Careers without any shared skill score 0.0 and were never touched by the index;
+    # they trail the ranking in catalog order unless a positive min_score excludes them.
+    if min_score is None or min_score <= 0:
+        for position in range(len(index.careers)):
+            if top_k is not None and len(ranked) >= top_k:
+                break
+            if position not in scores:
+                ranked.append(position)
 
-    # Sort recommendations by score in descending order
-    return sorted(recommendations, key=lambda x: x['score'], reverse=True)
+    return [{'career': index.careers[position], 'score': scores.get(position, 0.0)} for position in ranked]
 
 def analyze_skill_gap(user_skills, required_skills):
-    """Identifies skills the user is missing for a specific career."""
+    """
+    Identifies skills the user is missing for a specific career.
+    `required_skills` may be a precomputed frozenset of lowercased skills.
+    """
     user_skills_set = set(skill.lower() for skill in user_skills)
-    required_skills_set = set(skill.lower() for skill in required_skills)
+    if isinstance(required_skills, frozenset):
+        required_skills_set = required_skills
+    else:
+        required_skills_set = set(skill.lower() for skill in required_skills)
     return list(required_skills_set - user_skills_set)
 
-def recommend_courses(skill_gap, courses_data):
-    """Recommends courses for the skills in the skill gap."""
-    recommendations = []
+def _course_skills(course):
+    """Returns the skills a course teaches, accepting both the `skill` and `relevant_skills` schemas."""
+    skills = list(course.get('relevant_skills', []))
+    if course.get('skill'):
+        skills.append(course['skill'])
+    return set(skill.lower() for skill in skills)
+
+class CourseIndex:
+    """
+    A skill -> course index over a course catalog, built once per catalog load.
+    Each course also carries a bitmask of the skills it teaches so learning plans
+    can be assembled with integer operations.
+    """
+
+    def __init__(self, courses_data):
+        self.courses = list(courses_data)
+        self.skill_bits = {}
+        self.course_masks = []
+        self.postings = {}
+
+        for position, course in enumerate(self.courses):
+            mask = 0
+            for skill in _course_skills(course):
+                bit = self.skill_bits.setdefault(skill, 1 << len(self.skill_bits))
+                mask |= bit
+                self.postings.setdefault(skill, []).append(position)
+            self.course_masks.append(mask)
+
+    def candidates(self, skill_gap_set):
+        """Returns the catalog positions of courses teaching any of the given skills, in catalog order."""
+        positions = set()
+        for skill in skill_gap_set:
+            positions.update(self.postings.get(skill, ()))
+        return sorted(positions)
+
+    def minimal_plan(self, skill_gap_set):
+        """
+        Picks a small set of courses covering as much of the skill gap as the catalog allows.
+        Greedy set cover: repeatedly take the course that teaches the most still-uncovered
+        skills, preferring earlier catalog entries on ties.
+        """
+        uncovered = 0
+        for skill in skill_gap_set:
+            uncovered |= self.skill_bits.get(skill, 0)
+
+        candidates = self.candidates(skill_gap_set)
+        plan = []
+        while uncovered:
+            best_position, best_gain = None, 0
+            for position in candidates:
+                gain = (self.course_masks[position] & uncovered).bit_count()
+                if gain > best_gain:
+                    best_position, best_gain = position, gain
+            if best_position is None:
+                break
+            plan.append(best_position)
+            uncovered &= ~self.course_masks[best_position]
+        return plan
+
+# Returns the CourseIndex for a courses list (or a prebuilt index), reusing the last one built.
+get_course_index = built_from_last(CourseIndex)
+
+def recommend_courses(skill_gap, courses_data, minimal=False):
+    """
+    Recommends courses for the skills in the skill gap.
+    By default every matching course is returned in catalog order; with `minimal=True`
+    only the smallest greedy set of courses covering the gap is returned.
+    `courses_data` may be a prebuilt CourseIndex.
+    """
+    index = get_course_index(courses_data)
     skill_gap_set = set(s.lower() for s in skill_gap)
 
-    for course in courses_data:
-        course_skills_set = set(s.lower() for s in course.get('relevant_skills', []))
-        if not skill_gap_set.isdisjoint(course_skills_set):
-            recommendations.append(course)
-            
-    return recommendations
\ No newline at end of file
+    if minimal:
+        positions = index.minimal_plan(skill_gap_set)
+    else:
+        positions = index.candidates(skill_gap_set)
+    return [index.courses[position] for position in positions]
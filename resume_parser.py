@@ -0,0 +1,228 @@
+import importlib.util
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import metrics
+
+# --- Limits ---
+# Uploads are rejected above MAX_RESUME_BYTES. PDFs are read page by page up to
+# MAX_RESUME_PAGES, and extraction stops early once MAX_RESUME_CHARS characters
+# have been collected, which is plenty for skill extraction. The whole parse must
+# finish within RESUME_PARSE_TIMEOUT seconds.
+MAX_RESUME_BYTES = int(os.environ.get('MAX_RESUME_BYTES', 5 * 1024 * 1024))
+MAX_RESUME_PAGES = int(os.environ.get('MAX_RESUME_PAGES', 20))
+MAX_RESUME_CHARS = int(os.environ.get('MAX_RESUME_CHARS', 50000))
+RESUME_PARSE_TIMEOUT = float(os.environ.get('RESUME_PARSE_TIMEOUT', 10.0))
+# PDF and DOCX parsing runs in this many worker processes; 0 parses in-process.
+# An upload arriving while every worker is busy waits up to RESUME_PARSE_QUEUE_WAIT
+# seconds for one, so short bursts queue; past that it is refused (ResumeParseBusy).
+RESUME_PARSE_QUEUE_WAIT = float(os.environ.get('RESUME_PARSE_QUEUE_WAIT', 5.0))
+RESUME_PARSE_WORKERS = int(os.environ.get('RESUME_PARSE_WORKERS', 2))
+
+SUPPORTED_FORMATS = {
+    '.pdf': {'name': 'PDF', 'module': 'PyPDF2', 'package': 'PyPDF2'},
+    '.docx': {'name': 'DOCX', 'module': 'docx', 'package': 'python-docx'},
+    '.txt': {'name': 'TXT', 'module': None, 'package': None},
+}
+
+class ResumeParseError(Exception):
+    """Raised when an upload cannot be parsed; the message is safe to show to the user."""
+
+class ResumeParseBusy(ResumeParseError):
+    """Raised when every parse worker is already in use."""
+
+    def __init__(self):
+        super().__init__("The server is busy processing other resumes. Please try again in a moment.")
+
+# Set up basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Checking for the optional parsers does not import them; they are only loaded
+# by the process that actually parses a document.
+_missing_packages = [
+    info['package'] for info in SUPPORTED_FORMATS.values()
+    if info['module'] and importlib.util.find_spec(info['module']) is None
+]
+if _missing_packages:
+    install_command = f"pip install {' '.join(_missing_packages)}"
+    logging.warning(f"Optional dependencies not installed for resume parsing. To enable PDF/DOCX uploads, run: '{install_command}'")
+
+def _extract_pdf(data, max_pages, max_chars, deadline):
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+    parts, collected = [], 0
+    # reader.pages parses each page lazily, so pages past the limits are never touched.
+    for index, page in enumerate(pdf_reader.pages):
+        if index >= max_pages or collected >= max_chars or time.monotonic() >= deadline:
+            break
+        text = page.extract_text() or ""
+        parts.append(text)
+        collected += len(text)
+    return "".join(parts)[:max_chars]
+
+def _extract_docx(data, max_pages, max_chars, deadline):
+    import docx
+
+    document = docx.Document(io.BytesIO(data))
+    parts, collected = [], 0
+    for para in document.paragraphs:
+        if collected >= max_chars or time.monotonic() >= deadline:
+            break
+        parts.append(para.text)
+        collected += len(para.text) + 1
+    return "\n".join(parts)[:max_chars]
+
+def _extract_txt(data, max_pages, max_chars, deadline):
+    return data.decode('utf-8')[:max_chars]
+
+_EXTRACTORS = {'.pdf': _extract_pdf, '.docx': _extract_docx, '.txt': _extract_txt}
+
+def _extract(file_ext, data, max_pages, max_chars, timeout):
+    """Runs in a worker process; the deadline is measured from when parsing starts there."""
+    deadline = time.monotonic() + timeout
+    return _EXTRACTORS[file_ext](data, max_pages, max_chars, deadline)
+
+# --- Worker processes ---
+# At most RESUME_PARSE_WORKERS parses run in worker processes at once; a parse
+# that finds them all busy waits briefly for one, and a job's deadline starts
+# when its worker picks it up. Workers are spawned rather than forked so
+# they never inherit the web worker's threads or open database connections, and
+# are kept for reuse. A worker that overruns its deadline is terminated on its
+# own; the other workers keep running.
+
+# How long to wait for a new worker process to pick up its first job.
+WORKER_START_TIMEOUT = 30.0
+
+_idle_workers = []
+_workers_lock = threading.Lock()
+_worker_slots = threading.BoundedSemaphore(max(RESUME_PARSE_WORKERS, 1))
+
+class _WorkerDied(Exception):
+    pass
+
+class _JobFailed(RuntimeError):
+    """The file could not be parsed; the worker itself is fine and can be reused."""
+
+def _worker_main(conn):
+    """Worker process loop: acknowledges each job when it starts, then sends back its result."""
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        conn.send(('started', None))
+        try:
+            conn.send(('ok', _extract(*job)))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+class _ParseWorker:
+    """One parse process and the pipe to it. Used by one request at a time."""
+
+    def __init__(self):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def _receive(self, timeout):
+        try:
+            ready = self.conn.poll(timeout)
+            message = self.conn.recv() if ready else None
+        except (EOFError, OSError):
+            raise _WorkerDied(f"parse worker {self.process.pid} exited")
+        if message is None:
+            raise TimeoutError()
+        return message
+
+    def run(self, job, timeout):
+        """Runs one job; raises TimeoutError if it has not finished `timeout` seconds after it started."""
+        try:
+            self.conn.send(job)
+        except OSError:
+            raise _WorkerDied(f"parse worker {self.process.pid} exited")
+        self._receive(WORKER_START_TIMEOUT)
+        # The worker stops reading pages at its own deadline; the slack covers
+        # returning what it has. Past that it is stuck, e.g. inside one page.
+        status, result = self._receive(timeout + 1.0)
+        if status == 'error':
+            raise _JobFailed(result)
+        return result
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join(timeout=1.0)
+        self.conn.close()
+
+def _run_in_worker(job, timeout):
+    if not _worker_slots.acquire(timeout=RESUME_PARSE_QUEUE_WAIT):
+        raise ResumeParseBusy()
+    try:
+        with _workers_lock:
+            worker = _idle_workers.pop() if _idle_workers else None
+        if worker is None:
+            worker = _ParseWorker()
+        try:
+            result = worker.run(job, timeout)
+        except _JobFailed:
+            with _workers_lock:
+                _idle_workers.append(worker)
+            raise
+        except BaseException:
+            worker.stop()
+            raise
+        with _workers_lock:
+            _idle_workers.append(worker)
+        return result
+    finally:
+        _worker_slots.release()
+
+def parse_resume(filename, stream):
+    """
+    Extracts text from an uploaded resume (PDF, DOCX, TXT) within the configured limits.
+    Raises ResumeParseError with a user-facing message when the upload is rejected,
+    and ResumeParseBusy when all parse workers are in use.
+    """
+    file_ext = os.path.splitext(filename or '')[1].lower()
+    format_info = SUPPORTED_FORMATS.get(file_ext)
+    if not format_info:
+        raise ResumeParseError("Unsupported file type. Please upload a PDF, DOCX, or TXT file.")
+
+    file_type_name = format_info['name']
+    if format_info['package'] in _missing_packages:
+        raise ResumeParseError(f"{file_type_name} processing is not available. Please install {format_info['package']}.")
+
+    data = stream.read(MAX_RESUME_BYTES + 1)
+    if len(data) > MAX_RESUME_BYTES:
+        raise ResumeParseError(f"The uploaded file is too large. Please upload a file under {MAX_RESUME_BYTES // (1024 * 1024)} MB.")
+
+    job = (file_ext, data, MAX_RESUME_PAGES, MAX_RESUME_CHARS, RESUME_PARSE_TIMEOUT)
+    started = time.perf_counter()
+    try:
+        if file_ext == '.txt' or RESUME_PARSE_WORKERS <= 0:
+            text = _extract(*job)
+        else:
+            text = _run_in_worker(job, RESUME_PARSE_TIMEOUT)
+    except ResumeParseBusy:
+        metrics.inc('resume_parse_rejected_total', format=file_type_name)
+        logging.warning(f"Refused a {file_type_name} parse: all {RESUME_PARSE_WORKERS} parse workers stayed busy for {RESUME_PARSE_QUEUE_WAIT}s.")
+        raise
+    except TimeoutError:
+        metrics.observe('resume_parse_seconds', time.perf_counter() - started, format=file_type_name, result='timeout')
+        logging.error(f"Parsing a {file_type_name} file exceeded {RESUME_PARSE_TIMEOUT}s; its worker was stopped.")
+        raise ResumeParseError(f"The uploaded {file_type_name} file took too long to process. Please try a smaller file.")
+    except Exception as e:
+        metrics.observe('resume_parse_seconds', time.perf_counter() - started, format=file_type_name, result='error')
+        logging.error(f"Error reading {file_type_name} file: {e}")
+        raise ResumeParseError(f"Could not read the uploaded {file_type_name} file. It might be corrupted or protected.")
+
+    elapsed = time.perf_counter() - started
+    metrics.observe('resume_parse_seconds', elapsed, format=file_type_name, result='ok')
+    logging.info(f"Parsed {file_type_name} resume ({len(data)} bytes, {len(text)} chars) in {elapsed:.3f}s.")
+    return text
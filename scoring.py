@@ -0,0 +1,136 @@
+import numpy as np
+from scipy import sparse
+
+SCORING_METHODS = ('jaccard', 'weighted_jaccard', 'tfidf')
+
+class CareerScoringEngine:
+    """
+    Vectorized career scoring over a sparse career x skill matrix.
+
+    The catalog is encoded once; any number of users can then be scored with a
+    single sparse matrix product. Only careers sharing at least one skill with a
+    user get a stored score, every other score is an implicit zero.
+
+    Methods:
+      - 'jaccard': |U & C| / |U | C|, identical to calculate_jaccard_similarity.
+      - 'weighted_jaccard': the same ratio with each skill counted by its weight.
+      - 'tfidf': cosine similarity between weighted skill vectors.
+    Weights default to smoothed inverse document frequencies over the catalog, so
+    rare skills count for more than ones every career asks for.
+
+    `careers_data` is a list of careers, or anything with a `careers` attribute
+    such as a CatalogSnapshot or CareerIndex.
+    """
+
+    def __init__(self, careers_data, skill_weights=None):
+        self.careers = list(getattr(careers_data, 'careers', careers_data))
+        self.vocabulary = {}
+
+        rows, cols = [], []
+        for position, career in enumerate(self.careers):
+            for skill in set(s.lower() for s in career.get('required_skills', [])):
+                rows.append(position)
+                cols.append(self.vocabulary.setdefault(skill, len(self.vocabulary)))
+
+        shape = (len(self.careers), len(self.vocabulary))
+        data = np.ones(len(rows), dtype=np.float64)
+        self.career_matrix = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+        self.career_sizes = np.asarray(self.career_matrix.sum(axis=1)).ravel()
+
+        # Same smoothing as scikit-learn's TfidfTransformer: skills unknown to the
+        # catalog (df = 0) get the largest weight.
+        document_frequency = np.asarray(self.career_matrix.sum(axis=0)).ravel()
+        n_careers = len(self.careers)
+        self.unknown_skill_weight = float(np.log(1.0 + n_careers) + 1.0)
+        self.skill_weights = np.log((1.0 + n_careers) / (1.0 + document_frequency)) + 1.0
+        if skill_weights:
+            for skill, weight in skill_weights.items():
+                column = self.vocabulary.get(skill.lower())
+                if column is not None:
+                    self.skill_weights[column] = weight
+
+        weighted = self.career_matrix.multiply(self.skill_weights[np.newaxis, :]).tocsr()
+        self._weighted_career_matrix = weighted
+        self._weighted_career_sizes = np.asarray(weighted.sum(axis=1)).ravel()
+        self._career_norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+
+    def encode(self, skill_lists):
+        """
+        Encodes user skill lists as a sparse user x skill matrix.
+        Returns (matrix, sizes, unknown_weights): `sizes` counts every distinct skill,
+        including ones no career requires, because they still widen the Jaccard union.
+        """
+        rows, cols = [], []
+        sizes = np.zeros(len(skill_lists), dtype=np.float64)
+        unknown_counts = np.zeros(len(skill_lists), dtype=np.float64)
+
+        for row, user_skills in enumerate(skill_lists):
+            user_skills_set = set(skill.lower() for skill in user_skills)
+            sizes[row] = len(user_skills_set)
+            for skill in user_skills_set:
+                column = self.vocabulary.get(skill)
+                if column is None:
+                    unknown_counts[row] += 1
+                else:
+                    rows.append(row)
+                    cols.append(column)
+
+        data = np.ones(len(rows), dtype=np.float64)
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(skill_lists), len(self.vocabulary)))
+        return matrix, sizes, unknown_counts * self.unknown_skill_weight
+
+    def score_matrix(self, skill_lists, method='jaccard'):
+        """Scores a batch of users and returns a sparse users x careers score matrix."""
+        if method not in SCORING_METHODS:
+            raise ValueError(f"Unknown scoring method '{method}'. Expected one of {SCORING_METHODS}.")
+
+        user_matrix, user_sizes, unknown_weights = self.encode(skill_lists)
+
+        if method == 'jaccard':
+            overlap = (user_matrix @ self.career_matrix.T).tocoo()
+            union = user_sizes[overlap.row] + self.career_sizes[overlap.col] - overlap.data
+            scores = overlap.data / union
+        else:
+            weighted_users = user_matrix.multiply(self.skill_weights[np.newaxis, :]).tocsr()
+            if method == 'weighted_jaccard':
+                overlap = (weighted_users @ self.career_matrix.T).tocoo()
+                user_weight = np.asarray(weighted_users.sum(axis=1)).ravel() + unknown_weights
+                union = user_weight[overlap.row] + self._weighted_career_sizes[overlap.col] - overlap.data
+                scores = overlap.data / union
+            else:
+                overlap = (weighted_users @ self._weighted_career_matrix.T).tocoo()
+                known_norm_sq = np.asarray(weighted_users.multiply(weighted_users).sum(axis=1)).ravel()
+                user_norms = np.sqrt(known_norm_sq + unknown_weights * self.unknown_skill_weight)
+                scores = overlap.data / (user_norms[overlap.row] * self._career_norms[overlap.col])
+
+        return sparse.csr_matrix((scores, (overlap.row, overlap.col)), shape=overlap.shape)
+
+    def score(self, skill_lists, method='jaccard'):
+        """Scores a batch of users and returns a dense users x careers array."""
+        return self.score_matrix(skill_lists, method).toarray()
+
+    def top_k(self, skill_lists, k, method='jaccard', batch_size=1024):
+        """
+        Returns, for every user, the k best (career position, score) pairs.
+        Users are scored in chunks of `batch_size` so memory stays bounded for
+        large re-scoring jobs. Ties keep catalog order; zero scores are omitted.
+        """
+        results = []
+        for start in range(0, len(skill_lists), batch_size):
+            matrix = self.score_matrix(skill_lists[start:start + batch_size], method)
+            for row in range(matrix.shape[0]):
+                begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+                positions = matrix.indices[begin:end]
+                scores = matrix.data[begin:end]
+                # lexsort sorts by its last key first: score descending, then position.
+                order = np.lexsort((positions, -scores))[:k]
+                results.append([(int(positions[i]), float(scores[i])) for i in order])
+        return results
+
+    def recommend(self, user_skills, top_k=None, method='jaccard'):
+        """Returns recommendations for one user in the same shape as recommend_careers."""
+        scores = self.score([user_skills], method)[0]
+        order = np.lexsort((np.arange(len(scores)), -scores))
+        if top_k is not None:
+            order = order[:top_k]
+        return [{'career': self.careers[i], 'score': float(scores[i])} for i in order]
@@ -1,34 +1,307 @@
+import functools
+import os
 import re
 
+from ttl_cache import built_from_last
+
 # This mapping helps find skills that have common alternative names or acronyms
 # not already covered by being separate entries in skills.json.
 # The key is the canonical skill name from skills.json.
-# The value is a list of additional regex-safe strings to match.
+# The value is a list of additional literal strings to match.
 SKILL_VARIATIONS = {
     "Node.js": ["NodeJS"],
     "UI/UX Design": ["UI/UX"],
 }
 
-def extract_skills(text, skills_list):
+# --- Fuzzy matching ---
+# Off by default; when enabled, phrases that are not an exact skill or alias are
+# looked up in a character-trigram index and accepted when their edit-distance
+# similarity to a skill (1 - distance / longer length) reaches the threshold.
+FUZZY_MATCHING = os.environ.get('SKILL_FUZZY_MATCHING', '').lower() in ('1', 'true', 'yes')
+FUZZY_THRESHOLD = float(os.environ.get('SKILL_FUZZY_THRESHOLD', 0.8))
+# Short names are too close to ordinary words to correct: one edit turns "React"
+# into "reach", "Swift" into "shift" and "Figma" into "Sigma". Phrases and skills
+# shorter than FUZZY_MIN_LENGTH are never corrected, and those up to
+# FUZZY_SHORT_LENGTH characters by at most one edit, whatever the threshold. A
+# term is held to the shortest of itself and the skills it names, so "reacts"
+# is not corrected to React through its alias "ReactJS".
+FUZZY_MIN_LENGTH = 6
+FUZZY_SHORT_LENGTH = 8
+
+# Phrases made only of these words are prose, not misspelt skills.
+COMMON_WORDS = frozenset("""
+    a about after all also an and any are as at be been before being between both
+    but by can could did do does for from had has have he her his how i if in into
+    is it its me more most my no not of on once only or other our out over she so
+    some such than that the their them then there these they this those through to
+    too under up very was we were what when where which while who will with would
+    you your
+    """.split())
+
+# Punctuation stripped from the ends of words before fuzzy lookup; `+` and `#`
+# are kept for names like "C++".
+_TOKEN_STRIP = '.,;:!?()[]{}<>"\'`*|/\\-'
+
+def _trigrams(phrase):
+    padded = f" {phrase} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def _max_edits_for_length(length):
+    """The most edits a fuzzy match may make to a phrase or term of this length."""
+    if length < FUZZY_MIN_LENGTH:
+        return 0
+    if length <= FUZZY_SHORT_LENGTH:
+        return 1
+    return length
+
+def _fuzzy_score(phrase, term, threshold, guard_length):
     """
-    Extracts known skills from a given text using regular expressions.
-    This version is case-insensitive, handles word boundaries, and can be
-    extended with variations (e.g., "Node.js" vs "NodeJS").
+    Returns the similarity of phrase to term if a fuzzy match may accept it, else None.
+    `guard_length` is the length that caps the edits allowed on the term's side.
+    """
+    distance = _edit_distance(phrase, term)
+    if distance > min(_max_edits_for_length(len(phrase)), _max_edits_for_length(guard_length)):
+        return None
+    score = 1.0 - distance / max(len(phrase), len(term))
+    return score if score >= threshold else None
+
+def _is_word_char(char):
+    """Mirrors the regex engine's notion of a word character for \\b checks."""
+    return char.isalnum() or char == '_'
+
+def _trie_pattern(terms):
+    """
+    Builds a regex fragment matching any of the given lowercase terms.
+    The terms are folded into a character trie so the engine walks shared
+    prefixes once instead of trying every alternative at every position.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def to_regex(node):
+        is_terminal = '' in node
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if is_terminal:
+            # Greedy optional suffix: longer terms are tried first, shorter ones on backtrack.
+            return '(?:' + body + ')?'
+        return body
+
+    return to_regex(trie)
+
+class SkillMatcher:
+    """
+    A compiled, single-pass matcher over a skills catalog.
+    Build it once per catalog load and reuse it for every request; it returns
+    the same canonical skill names as a per-skill word-boundary search.
     """
-    found_skills = set()
 
-    for skill in skills_list:
-        # The primary pattern is the skill name itself, escaped for regex safety.
-        patterns_to_check = [re.escape(skill)]
+    def __init__(self, skills_list, variations=None, aliases=None):
+        variations = SKILL_VARIATIONS if variations is None else variations
+        aliases = aliases or {}
+        self.skills = list(skills_list)
+
+        # Every searchable term (lowercased) maps to the canonical skills it stands for.
+        self._term_to_skills = {}
+        for skill in self.skills:
+            for term in [skill] + list(variations.get(skill, [])) + list(aliases.get(skill, [])):
+                self._term_to_skills.setdefault(term.lower(), set()).add(skill)
+
+        # At a given position the trie returns only the longest term, so record the
+        # shorter terms that are implied by it (e.g. "React" inside "React Native").
+        self._implied_terms = {}
+        for term in self._term_to_skills:
+            for end in range(1, len(term)):
+                prefix = term[:end]
+                if prefix in self._term_to_skills and _is_word_char(term[end - 1]) != _is_word_char(term[end]):
+                    self._implied_terms.setdefault(term, []).append(prefix)
 
-        # Check if there are known variations for this skill.
-        if skill in SKILL_VARIATIONS:
-            patterns_to_check.extend(SKILL_VARIATIONS[skill])
+        if self._term_to_skills:
+            # The lookahead keeps the match zero-width so overlapping skills are all found.
+            pattern = r'(?=\b(' + _trie_pattern(self._term_to_skills) + r')\b)'
+            self._regex = re.compile(pattern, re.IGNORECASE)
+        else:
+            self._regex = None
 
-        # Build a single regex pattern for the skill and its variations, using word boundaries.
-        combined_pattern = r'\b(' + '|'.join(patterns_to_check) + r')\b'
+        # Trigram -> terms containing it, for fuzzy candidate lookup. Terms are
+        # assigned IDs in order so posting lists are plain sorted lists.
+        self._terms = sorted(self._term_to_skills)
+        self._term_trigrams = [_trigrams(term) for term in self._terms]
+        self._trigram_postings = {}
+        for term_id, trigrams in enumerate(self._term_trigrams):
+            for trigram in trigrams:
+                self._trigram_postings.setdefault(trigram, []).append(term_id)
+        # Length -> terms of that length, for thresholds too low for the trigram filter.
+        # The length that caps a term's edits: its own or its shortest skill's.
+        self._term_guard_lengths = [
+            min([len(term)] + [len(skill) for skill in self._term_to_skills[term]]) for term in self._terms
+        ]
+        self._terms_by_length = {}
+        for term_id, term in enumerate(self._terms):
+            self._terms_by_length.setdefault(len(term), []).append(term_id)
+        self._max_term_words = max((len(term.split()) for term in self._terms), default=1)
+        # Many phrases ("experience", "team") recur across resumes; remember their lookups.
+        self._fuzzy_lookup = functools.lru_cache(maxsize=65536)(self._fuzzy_lookup_uncached)
+
+    def extract(self, text, fuzzy=False, threshold=None):
+        """Scans the text once and returns the sorted canonical skills found."""
+        if fuzzy:
+            return [match['skill'] for match in self.match(text, fuzzy=True, threshold=threshold)]
+        if not self._regex or not text:
+            return []
+
+        found_terms = set()
+        for match in self._regex.finditer(text):
+            term = match.group(1).lower()
+            if term in found_terms:
+                continue
+            found_terms.add(term)
+            found_terms.update(self._implied_terms.get(term, ()))
+
+        found_skills = set()
+        for term in found_terms:
+            found_skills.update(self._term_to_skills.get(term, ()))
+        return sorted(found_skills)
+
+    def match(self, text, fuzzy=False, threshold=None):
+        """
+        Like extract(), but reports how each skill was found, sorted by skill:
+        {'skill', 'source' ('exact', 'alias' or 'fuzzy'), 'matched' (the text as
+        written), 'term' (the skill name or alias it matched) and 'score'}.
+        Exact and alias hits score 1.0; a skill keeps its best-ranked hit.
+        """
+        if not self._regex or not text:
+            return []
+
+        found = {}
+        def add(skill, source, matched, term, score):
+            if skill not in found:
+                found[skill] = {'skill': skill, 'source': source, 'matched': matched, 'term': term, 'score': score}
+
+        # Term -> the first text it was found as.
+        seen_terms = {}
+        for regex_match in self._regex.finditer(text):
+            surface = regex_match.group(1)
+            term = surface.lower()
+            if term in seen_terms:
+                continue
+            for matched_term in [term] + self._implied_terms.get(term, []):
+                seen_terms.setdefault(matched_term, surface[:len(matched_term)])
+                for skill in self._term_to_skills[matched_term]:
+                    source = 'exact' if skill.lower() == matched_term else 'alias'
+                    add(skill, source, seen_terms[matched_term], matched_term, 1.0)
+
+        # An exact hit on a skill outranks an alias hit found earlier in the text.
+        for term, surface in seen_terms.items():
+            for skill in self._term_to_skills[term]:
+                if skill.lower() == term:
+                    found[skill].update(source='exact', matched=surface, term=term)
+
+        if fuzzy:
+            threshold = FUZZY_THRESHOLD if threshold is None else threshold
+            for phrase, surface in self._fuzzy_phrases(text):
+                hit = self._fuzzy_lookup(phrase, threshold)
+                if hit is not None:
+                    term, score = hit
+                    for skill in self._term_to_skills[term]:
+                        add(skill, 'fuzzy', surface, term, round(score, 3))
+
+        return [found[skill] for skill in sorted(found)]
+
+    def _fuzzy_phrases(self, text):
+        """Yields (normalized, as-written) word sequences not already matched exactly."""
+        words = [word.strip(_TOKEN_STRIP) for word in text.split()]
+        words = [word for word in words if word]
+        seen = set()
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + self._max_term_words, len(words)) + 1):
+                surface = ' '.join(words[start:end])
+                phrase = surface.lower()
+                if (phrase in seen or phrase in self._term_to_skills or len(phrase) < FUZZY_MIN_LENGTH
+                        or not any(char.isalpha() for char in phrase)
+                        or all(word in COMMON_WORDS for word in phrase.split())):
+                    continue
+                seen.add(phrase)
+                yield phrase, surface
+
+    def _fuzzy_lookup_uncached(self, phrase, threshold):
+        """
+        Returns (term, similarity) for the closest term at or above the threshold, or None.
+        Candidates come from the trigram index with a prefix filter: a term within the
+        allowed edit distance must share all but a few of the phrase's trigrams, so
+        only the rarest few posting lists need to be read to find every candidate.
+        Below a threshold of about 0.7 that bound no longer holds (a close term may
+        share no trigram at all), so every term of a near enough length is scored.
+        """
+        trigrams = _trigrams(phrase)
+        # Any accepted term is at most len(phrase) / threshold long, which bounds the
+        # edit distance; each edit changes at most three trigrams. Short phrases
+        # allow fewer edits still.
+        max_edits = min(int(len(phrase) * (1 - threshold) / threshold + 1e-9), _max_edits_for_length(len(phrase)))
+        if max_edits == 0:
+            return None
+        required = len(trigrams) - 3 * max_edits
+        candidates = set()
+        if required > 0:
+            known = sorted((t for t in trigrams if t in self._trigram_postings), key=lambda t: len(self._trigram_postings[t]))
+            for trigram in known[:len(trigrams) - required + 1]:
+                candidates.update(self._trigram_postings[trigram])
+        else:
+            for length in range(len(phrase) - max_edits, len(phrase) + max_edits + 1):
+                candidates.update(self._terms_by_length.get(length, ()))
+
+        best = None
+        for term_id in candidates:
+            term = self._terms[term_id]
+            guard_length = self._term_guard_lengths[term_id]
+            if abs(len(term) - len(phrase)) > max_edits or guard_length < FUZZY_MIN_LENGTH:
+                continue
+            if required > 0 and len(trigrams & self._term_trigrams[term_id]) < required:
+                continue
+            score = _fuzzy_score(phrase, term, threshold, guard_length)
+            if score is not None and (best is None or score > best[1] or (score == best[1] and term < best[0])):
+                best = (term, score)
+        return best
+
+    def _fuzzy_lookup_scan(self, phrase, threshold):
+        """_fuzzy_lookup_uncached without the index: scores every term. For checking the index."""
+        best = None
+        for term, guard_length in zip(self._terms, self._term_guard_lengths):
+            score = _fuzzy_score(phrase, term, threshold, guard_length)
+            if score is not None and (best is None or score > best[1] or (score == best[1] and term < best[0])):
+                best = (term, score)
+        return best
+
+# Returns the SkillMatcher for a skills list (or a prebuilt matcher), reusing the last one built.
+get_skill_matcher = built_from_last(SkillMatcher)
+
+def extract_skills(text, skills_list, fuzzy=None, threshold=None):
+    """
+    Extracts known skills from a given text using a single compiled pattern.
+    This version is case-insensitive, handles word boundaries, and can be
+    extended with variations (e.g., "Node.js" vs "NodeJS").
+    `skills_list` may be a list of skill names or a prebuilt SkillMatcher.
+    `fuzzy` also accepts near-misses such as "Kubernates"; it defaults to SKILL_FUZZY_MATCHING.
+    """
+    fuzzy = FUZZY_MATCHING if fuzzy is None else fuzzy
+    return get_skill_matcher(skills_list).extract(text, fuzzy=fuzzy, threshold=threshold)
 
-        # Search for the pattern in the text, ignoring case.
-        if re.search(combined_pattern, text, re.IGNORECASE):
-            found_skills.add(skill)
-    return sorted(list(found_skills))
\ No newline at end of file
+def extract_skill_matches(text, skills_list, fuzzy=None, threshold=None):
+    """Like extract_skills, but returns SkillMatcher.match() records saying how each skill was found."""
+    fuzzy = FUZZY_MATCHING if fuzzy is None else fuzzy
+    return get_skill_matcher(skills_list).match(text, fuzzy=fuzzy, threshold=threshold)
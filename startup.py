@@ -0,0 +1,75 @@
+"""
+Startup timing for web workers.
+
+app.py imports this module first and calls mark() after each startup phase
+(imports, extensions, schema upgrade, catalog load), then finish(), which logs
+the breakdown and warns when the total exceeds STARTUP_BUDGET_SECONDS.
+Initialization that is deferred to first use (e.g. building the YouTube client)
+is timed with first_use() and reported separately. Phase, total and first-use
+times are also recorded as metrics, so /metrics shows them for every worker.
+
+benchmarks/bench_startup.py measures the same phases, plus a per-package import
+breakdown, across several cold starts.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 2.0))
+
+_state = {'started_at': time.perf_counter(), 'last_mark': time.perf_counter(), 'finished_at': None}
+_phases = []
+_first_use = {}
+_lock = threading.Lock()
+
+def mark(name):
+    """Records the time since the previous mark (or since this module loaded) as phase `name`."""
+    now = time.perf_counter()
+    _phases.append((name, now - _state['last_mark']))
+    metrics.observe('startup_phase_seconds', now - _state['last_mark'], phase=name)
+    _state['last_mark'] = now
+
+@contextmanager
+def first_use(name):
+    """Times a lazy initialization; only the first one recorded under a name is kept."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            first = name not in _first_use
+            _first_use.setdefault(name, elapsed)
+        if first:
+            metrics.observe('first_use_seconds', elapsed, component=name)
+
+def get_startup_report():
+    """Returns the startup phases, their total, the budget and first-use initialization times."""
+    finished_at = _state['finished_at'] or _state['last_mark']
+    total = finished_at - _state['started_at']
+    with _lock:
+        first_use_seconds = dict(_first_use)
+    return {
+        'phases': [{'name': name, 'seconds': round(seconds, 4)} for name, seconds in _phases],
+        'total_seconds': round(total, 4),
+        'budget_seconds': STARTUP_BUDGET_SECONDS,
+        'within_budget': total <= STARTUP_BUDGET_SECONDS,
+        'first_use': {name: round(seconds, 4) for name, seconds in first_use_seconds.items()},
+    }
+
+def finish():
+    """Ends the startup timing and logs the report."""
+    _state['finished_at'] = time.perf_counter()
+    report = get_startup_report()
+    metrics.observe('startup_seconds', report['total_seconds'])
+    breakdown = ', '.join(f"{phase['name']} {phase['seconds']:.3f}s" for phase in report['phases'])
+    message = f"Worker started in {report['total_seconds']:.3f}s ({breakdown}); budget {STARTUP_BUDGET_SECONDS:.1f}s."
+    if report['within_budget']:
+        logging.info(message)
+    else:
+        logging.warning(message + " Over budget; run benchmarks/bench_startup.py for an import breakdown.")
+    return report
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel returned by TTLCache.get_entry when a key is absent, so that cached
+# None values (e.g. negative lookups) can be told apart from misses.
+MISSING = object()
+
+class TTLCache:
+    """
+    A small thread-safe LRU cache with a per-entry time-to-live.
+    Entries past their expiry are treated as misses and dropped lazily; the
+    least recently used entries are evicted once `maxsize` is exceeded, or once
+    the summed `weigher(value)` of all entries exceeds `maxweight`.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic, weigher=None, maxweight=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigher = weigher
+        self.maxweight = maxweight
+        self.weight = 0
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _weigh(self, entry):
+        return self.weigher(entry[0]) if self.weigher else 0
+
+    def get_entry(self, key):
+        """Returns (value, expires_at) for a key, or MISSING. Expired entries are still returned."""
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is not MISSING:
+                self._data.move_to_end(key)
+            return entry
+
+    def get(self, key, default=None):
+        """Returns the cached value if present and not expired, otherwise `default`."""
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                self.weight -= self._weigh(entry)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """Stores a value. `ttl` overrides the cache default; `expires_at` pins an absolute expiry."""
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = None if ttl is None else self._clock() + ttl
+        with self._lock:
+            previous = self._data.pop(key, MISSING)
+            if previous is not MISSING:
+                self.weight -= self._weigh(previous)
+            entry = (value, expires_at)
+            self._data[key] = entry
+            self.weight += self._weigh(entry)
+            while self._data and (len(self._data) > self.maxsize or
+                                  (self.maxweight is not None and self.weight > self.maxweight)):
+                _, evicted = self._data.popitem(last=False)
+                self.weight -= self._weigh(evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, MISSING)
+            if entry is MISSING:
+                return default
+            self.weight -= self._weigh(entry)
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+def built_from_last(cls):
+    """
+    Returns a function that builds `cls(source)`, reusing the previous result
+    while it is called with the same source object (compared by identity). For
+    callers that pass the same plain catalog list on every request; an instance
+    of `cls` (e.g. an index prebuilt by the catalog snapshot) is returned as is.
+    """
+    state = {'entry': (None, None)}
+
+    def get(source):
+        if isinstance(source, cls):
+            return source
+        last_source, built = state['entry']
+        if last_source is not source:
+            built = cls(source)
+            state['entry'] = (source, built)
+        return built
+    return get
@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from ttl_cache import TTLCache, MISSING
+
+class VideoDetailsCache:
+    """
+    A two-tier cache for YouTube video details.
+
+    Lookups hit an in-process LRU first and a persistent SQLite store second, so
+    every gunicorn worker (and every restart) shares what has already been fetched.
+    Each entry carries its own expiry:
+      - found videos live for `ttl` seconds,
+      - IDs the API did not return are cached as misses for `negative_ttl` seconds,
+      - expired entries younger than `ttl + stale_ttl` are still served while a
+        background refresh fetches a fresh copy (stale-while-revalidate).
+
+    The SQLite store is best effort: if it cannot be created, read or written
+    (a read-only directory, a lock held past the timeout), the error is logged
+    and lookups fall back to the memory tier and the fetcher.
+    """
+
+    def __init__(self, db_path, ttl=7 * 24 * 3600, negative_ttl=24 * 3600,
+                 stale_ttl=30 * 24 * 3600, memory_size=2048, clock=time.time):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._memory = TTLCache(maxsize=memory_size, clock=clock)
+        self._refresh_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='video-cache-refresh')
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._init_store()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_store(self):
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS video_details ('
+                    'video_id TEXT PRIMARY KEY, payload TEXT, expires_at REAL NOT NULL)'
+                )
+        except (sqlite3.Error, OSError) as e:
+            logging.error(f"Could not open the video details store at {self.db_path}; caching in memory only: {e}")
+
+    def _load(self, video_ids):
+        """Reads entries from the persistent store into the memory tier."""
+        rows = []
+        if video_ids:
+            try:
+                with self._connect() as conn:
+                    # Chunked to stay under SQLite's bound-parameter limit.
+                    for i in range(0, len(video_ids), 500):
+                        chunk = video_ids[i:i + 500]
+                        placeholders = ','.join('?' * len(chunk))
+                        rows.extend(conn.execute(
+                            f'SELECT video_id, payload, expires_at FROM video_details WHERE video_id IN ({placeholders})',
+                            chunk,
+                        ).fetchall())
+            except sqlite3.Error as e:
+                logging.warning(f"Reading the video details store failed; using the memory tier only: {e}")
+                rows = []
+        entries = {}
+        for video_id, payload, expires_at in rows:
+            details = json.loads(payload) if payload is not None else None
+            self._memory.set(video_id, details, expires_at=expires_at)
+            entries[video_id] = (details, expires_at)
+        return entries
+
+    def store(self, video_ids, details_list):
+        """
+        Caches fetched details; requested IDs missing from `details_list` are cached as misses.
+        Returns the stored entries as {video_id: (details or None, expires_at)}.
+        """
+        now = self._clock()
+        details_by_id = {details['id']: details for details in details_list}
+        rows, entries = [], {}
+        for video_id in video_ids:
+            details = details_by_id.get(video_id)
+            expires_at = now + (self.ttl if details is not None else self.negative_ttl)
+            self._memory.set(video_id, details, expires_at=expires_at)
+            entries[video_id] = (details, expires_at)
+            rows.append((video_id, json.dumps(details) if details is not None else None, expires_at))
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO video_details (video_id, payload, expires_at) VALUES (?, ?, ?)',
+                    rows,
+                )
+        except sqlite3.Error as e:
+            # The entries are still in the memory tier of this process.
+            logging.warning(f"Writing to the video details store failed: {e}")
+        return entries
+
+    def get_many(self, video_ids, fetcher=None, refresher=None):
+        """
+        Returns details for the given IDs, in request order, skipping known misses.
+        `fetcher(ids)` is called for IDs with no usable cache entry and must return
+        a list of detail dicts (raising on upstream errors, so failures are not
+        cached as misses). Without a fetcher only cached entries are returned.
+        Stale entries are refreshed in the background with `refresher` (by default
+        the fetcher), e.g. when the fetcher gives up at the caller's deadline.
+        """
+        now = self._clock()
+        entries, unresolved = {}, []
+        for video_id in video_ids:
+            entry = self._memory.get_entry(video_id)
+            if entry is not MISSING:
+                entries[video_id] = entry
+            # Expired memory entries are re-read in case another worker already refreshed them.
+            if entry is MISSING or entry[1] <= now:
+                unresolved.append(video_id)
+
+        for video_id, entry in self._load(unresolved).items():
+            entries[video_id] = entry
+
+        to_fetch, to_refresh = [], []
+        for video_id in video_ids:
+            entry = entries.get(video_id)
+            if entry is None or entry[1] + self.stale_ttl <= now:
+                to_fetch.append(video_id)
+            elif entry[1] <= now:
+                to_refresh.append(video_id)
+
+        if fetcher and to_fetch:
+            try:
+                fetched = fetcher(to_fetch)
+            except Exception as e:
+                logging.error(f"Fetching video details failed; serving cached entries only: {e}")
+            else:
+                entries.update(self.store(to_fetch, fetched))
+
+        refresher = refresher or fetcher
+        if refresher and to_refresh:
+            self._schedule_refresh(to_refresh, refresher)
+
+        results = []
+        for video_id in video_ids:
+            entry = entries.get(video_id)
+            if entry is not None and entry[0] is not None:
+                results.append(entry[0])
+        return results
+
+    def _schedule_refresh(self, video_ids, fetcher):
+        with self._refresh_lock:
+            pending = [video_id for video_id in video_ids if video_id not in self._refreshing]
+            self._refreshing.update(pending)
+        if pending:
+            self._refresh_pool.submit(self._refresh, pending, fetcher)
+
+    def _refresh(self, video_ids, fetcher):
+        try:
+            self.store(video_ids, fetcher(video_ids))
+        except Exception as e:
+            logging.warning(f"Background refresh of video details failed: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.difference_update(video_ids)
+
+    def clear_memory(self):
+        self._memory.clear()
@@ -0,0 +1,76 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ttl_cache import TTLCache
+from youtube_service import get_video_cache, get_video_details
+
+# Video details are fetched off the request thread by a small, bounded pool, and
+# request handlers only ever check whether a fetch has finished, so a slow or hung
+# YouTube API never holds a web worker; the results page polls until it has.
+VIDEO_FETCH_WORKERS = int(os.environ.get('VIDEO_FETCH_WORKERS', 4))
+VIDEO_FETCH_MAX_PENDING = int(os.environ.get('VIDEO_FETCH_MAX_PENDING', 64))
+# Each fetch gets this many seconds from when it is submitted. It starts no API call
+# after that, and a fetch still running then is answered from the video cache. Keep
+# it below the ~30 s the results page polls for.
+VIDEO_FETCH_BUDGET = float(os.environ.get('VIDEO_FETCH_BUDGET', 20))
+
+_executor = ThreadPoolExecutor(max_workers=VIDEO_FETCH_WORKERS, thread_name_prefix='video-enrichment')
+_pending_slots = threading.BoundedSemaphore(VIDEO_FETCH_MAX_PENDING)
+
+# In-flight and finished fetches as (future, deadline), keyed by analysis ID (or, for
+# an analysis that is not saved yet, by the tuple of its video IDs). Finished jobs
+# linger for a few minutes so the results page can pick them up.
+_jobs = TTLCache(maxsize=1024, ttl=600)
+
+def _submit(video_ids, deadline):
+    """Submits a fetch to the pool, or returns None when too many fetches are already pending."""
+    if not _pending_slots.acquire(blocking=False):
+        logging.warning("Video enrichment queue is full; skipping video details for this request.")
+        return None
+    future = _executor.submit(get_video_details, list(video_ids), deadline=deadline)
+    future.add_done_callback(lambda _: _pending_slots.release())
+    return future
+
+def _start_job(analysis_id, video_ids):
+    """Starts a fetch and records it as (future, deadline); returns None if none was started."""
+    if not video_ids:
+        return None
+    deadline = time.monotonic() + VIDEO_FETCH_BUDGET
+    future = _submit(video_ids, deadline)
+    if future is None:
+        return None
+    job = (future, deadline)
+    _jobs.set(analysis_id, job)
+    return job
+
+def start_video_job(analysis_id, video_ids):
+    """Starts fetching details for an analysis' project videos in the background."""
+    job = _start_job(analysis_id, video_ids)
+    return job[0] if job else None
+
+def get_video_job_result(analysis_id, video_ids):
+    """
+    Returns {video_id: details} for an analysis, or None if the fetch is still running.
+    Never waits for the fetch. When the job is not known to this process (e.g. the
+    request landed on another gunicorn worker) a new fetch is started, which is usually
+    answered straight from the shared video cache by the next poll. A fetch still
+    running past its budget is answered with whatever the video cache holds.
+    """
+    job = _jobs.get(analysis_id) or _start_job(analysis_id, video_ids)
+    if job is None:
+        return {}
+    future, deadline = job
+    if not future.done():
+        if time.monotonic() < deadline:
+            return None
+        logging.warning(f"Fetching video details for analysis {analysis_id} overran {VIDEO_FETCH_BUDGET}s; serving cached details.")
+        return {detail['id']: detail for detail in get_video_cache().get_many(list(video_ids))}
+    try:
+        details_list = future.result()
+    except Exception as e:
+        logging.error(f"Fetching video details for analysis {analysis_id} failed: {e}")
+        return {}
+    return {detail['id']: detail for detail in details_list}
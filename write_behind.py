@@ -0,0 +1,183 @@
+import atexit
+import collections
+import logging
+import queue
+import threading
+import time
+
+import metrics
+
+class _RetriesExhausted(Exception):
+    """Raised when a transient write failure outlasts the retry budget."""
+
+class WriteBehindQueue:
+    """
+    Buffers rows in a bounded in-process queue and writes them from a background
+    thread, grouping up to `batch_size` rows per `write_batch(rows)` call. A batch
+    is written once it is full or its oldest row has waited `max_delay` seconds.
+
+    submit() never blocks: it returns False when the queue is full or closed, and
+    the caller should then write the row itself. If a batch fails, its rows are
+    retried one at a time so a single bad row cannot take the others with it.
+    Failures for which `is_transient(exc)` is true (e.g. a locked database) are
+    not the rows' fault: the write is retried, backing off from `retry_delay` up
+    to `max_retry_delay` seconds, for at most `max_retry_time` seconds, after
+    which the whole batch is dropped. Rows that fail otherwise are dropped too.
+    Rows still queued at interpreter exit are written before the process ends.
+
+    With `key(row)` (e.g. the row's owner), flush(key=...) waits only for rows
+    with that key, so readers are not held up by everyone else's writes.
+    """
+
+    def __init__(self, write_batch, maxsize=1000, batch_size=100, max_delay=0.05, name='write-behind',
+                 is_transient=None, retry_delay=0.1, max_retry_delay=5.0, max_retry_time=30.0, key=None):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.name = name
+        self.is_transient = is_transient or (lambda exc: False)
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_retry_time = max_retry_time
+        self.key = key
+        self._pending_keys = collections.Counter()
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._submitted = 0
+        self._completed = 0
+        self._closed = False
+        self._thread = None
+        self.stats = {'written': 0, 'failed': 0, 'batches': 0, 'rejected': 0, 'retries': 0}
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        # Started on first use, so a process forked after import gets its own thread.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, row):
+        """Queues a row for writing. Returns False if it was not accepted."""
+        with self._lock:
+            if self._closed:
+                self.stats['rejected'] += 1
+                return False
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.stats['rejected'] += 1
+                return False
+            self._submitted += 1
+            if self.key:
+                self._pending_keys[self.key(row)] += 1
+            self._ensure_thread()
+        return True
+
+    def flush(self, timeout=None, key=None):
+        """
+        Waits until every row submitted so far has been written (or failed), or with
+        `key`, until no row with that key is queued. Returns False on timeout.
+        """
+        with self._lock:
+            if key is not None:
+                return self._done.wait_for(lambda: not self._pending_keys[key], timeout)
+            target = self._submitted
+            return self._done.wait_for(lambda: self._completed >= target, timeout)
+
+    def close(self, timeout=30.0):
+        """Stops accepting rows and writes out everything still queued."""
+        with self._lock:
+            if self._closed:
+                return True
+            self._closed = True
+            pending = self._submitted - self._completed
+        if pending:
+            logging.info(f"{self.name}: flushing {pending} queued rows before shutdown.")
+        drained = self.flush(timeout)
+        if not drained:
+            logging.error(f"{self.name}: gave up waiting for {self._submitted - self._completed} queued rows.")
+        return drained
+
+    def pending(self):
+        with self._lock:
+            return self._submitted - self._completed
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_with_retries(self, batch):
+        """
+        Calls write_batch(batch), retrying transient failures with backoff. Raises
+        _RetriesExhausted once they have gone on for max_retry_time seconds, and
+        any other failure straight away.
+        """
+        delay = self.retry_delay
+        give_up_at = time.monotonic() + self.max_retry_time
+        while True:
+            started = time.perf_counter()
+            try:
+                self.write_batch(batch)
+                return
+            except Exception as e:
+                if not self.is_transient(e):
+                    raise
+                if time.monotonic() + delay > give_up_at:
+                    raise _RetriesExhausted(e) from e
+                logging.warning(f"{self.name}: writing {len(batch)} rows failed ({e}); retrying in {delay:g}s.")
+            finally:
+                metrics.observe('write_behind_batch_seconds', time.perf_counter() - started, queue=self.name)
+            with self._lock:
+                self.stats['retries'] += 1
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def _write(self, batch):
+        try:
+            self._write_with_retries(batch)
+            return len(batch), 0
+        except _RetriesExhausted as e:
+            # Not the rows' fault, so retrying them one by one would only wait longer.
+            logging.error(f"{self.name}: dropping {len(batch)} rows after retrying for "
+                          f"{self.max_retry_time:g}s: {e.__cause__}")
+            return 0, len(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                logging.error(f"{self.name}: dropping a row that could not be written: {e}")
+                return 0, 1
+            logging.warning(f"{self.name}: batch of {len(batch)} failed ({e}); retrying rows one by one.")
+
+        written = failed = 0
+        for row in batch:
+            row_written, row_failed = self._write([row])
+            written += row_written
+            failed += row_failed
+        return written, failed
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            written, failed = self._write(batch)
+            metrics.inc('write_behind_rows_total', written, queue=self.name, result='written')
+            if failed:
+                metrics.inc('write_behind_rows_total', failed, queue=self.name, result='failed')
+            with self._lock:
+                self.stats['written'] += written
+                self.stats['failed'] += failed
+                self.stats['batches'] += 1
+                self._completed += len(batch)
+                if self.key:
+                    for row in batch:
+                        row_key = self.key(row)
+                        self._pending_keys[row_key] -= 1
+                        if not self._pending_keys[row_key]:
+                            del self._pending_keys[row_key]
+                self._done.notify_all()
@@ -1,42 +1,97 @@
+import json
 import os
 import re
+import sys
 import logging
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from google.auth.exceptions import DefaultCredentialsError
+import tempfile
+import threading
+import time
+import functools
+from concurrent.futures import Future
+
+import metrics
+import startup
+from ttl_cache import TTLCache, MISSING
+from video_cache import VideoDetailsCache
 
 YOUTUBE_API_SERVICE_NAME = 'youtube'
 YOUTUBE_API_VERSION = 'v3'
+# The client is built from this bundled subset of the discovery document (just the
+# methods used here), so building it needs no network access and little parsing.
+DISCOVERY_DOCUMENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'youtube_discovery.json')
+# Quota units charged per call, from the YouTube Data API quota calculator.
+YOUTUBE_QUOTA_COSTS = {'videos.list': 1, 'search.list': 100}
 
 # Set up basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# A dictionary to hold the state of the YouTube service instance.
-# 'checked' will be True after the first attempt to build the service.
-# 'instance' will hold the service object or None.
-_youtube_service_state = {'instance': None, 'checked': False}
+# A dictionary to hold the state of the YouTube service.
+# 'checked' will be True after the first attempt to set the service up.
+# 'build' will hold a function that builds a new service object, or None.
+_youtube_service_state = {'build': None, 'checked': False}
+# Held while the service is set up, so it is set up once and other threads wait for it.
+_youtube_service_lock = threading.Lock()
+# Each thread builds its own service object: the httplib2 connection inside one
+# is not thread-safe, and request threads, the video enrichment executor and the
+# video cache refresh pool all call the API at once.
+_youtube_clients = threading.local()
 
 def get_youtube_service():
     """
-    Returns a YouTube service object, or None if API key is missing.
-    Caches the result to avoid repeated checks and warnings.
+    Returns this thread's YouTube service object, or None if the service cannot be built.
+    The discovery document and credentials are loaded once and shared by every
+    thread; failures are only checked (and warned about) once.
     """
-    global _youtube_service_state
+    service = getattr(_youtube_clients, 'service', None)
+    if service is not None:
+        return service
 
-    # If we've already checked, return the cached instance (which could be None).
-    if _youtube_service_state['checked']:
-        return _youtube_service_state['instance']
+    if not _youtube_service_state['checked']:
+        with _youtube_service_lock:
+            if not _youtube_service_state['checked']:
+                _youtube_service_state['build'] = _youtube_service_builder()
+                # Only mark the check done once the builder is in place.
+                _youtube_service_state['checked'] = True
+    build = _youtube_service_state['build']
+    if build is None:
+        return None
 
-    # Mark that we are performing the check now.
-    _youtube_service_state['checked'] = True
+    try:
+        service = build()
+    except Exception as e:
+        logging.error(f"An unexpected error occurred while building YouTube service: {e}")
+        return None
+    _youtube_clients.service = service
+    return service
+
+def _youtube_service_builder():
+    """
+    Returns a function that builds a YouTube service object, or None (after logging
+    why) if no service can be built.
+    """
+    # The client library is heavy to import, so it is only loaded once a service is needed.
+    try:
+        with startup.first_use('youtube_client_import'):
+            import google.auth
+            from googleapiclient.discovery import build_from_document
+            from googleapiclient.errors import HttpError
+            from google.auth.exceptions import DefaultCredentialsError
+    except ImportError as e:
+        logging.error(f"The YouTube client library is not installed ({e}). Run 'pip install google-api-python-client'.")
+        return None
 
     try:
-        # build() will automatically use the credentials configured by gcloud
-        # (Application Default Credentials) when no developerKey is provided.
-        service_instance = build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION)
-        _youtube_service_state['instance'] = service_instance
+        # Uses the credentials configured by gcloud (Application Default Credentials),
+        # as build_from_document() does when given none.
+        with startup.first_use('youtube_client_build'):
+            with open(DISCOVERY_DOCUMENT_PATH) as f:
+                document = json.load(f)
+            credentials, _ = google.auth.default(scopes=list(document['auth']['oauth2']['scopes']))
+            build = lambda: build_from_document(document, credentials=credentials)
+            # Build this thread's service now, so problems are reported once, here.
+            _youtube_clients.service = build()
         logging.info("YouTube service built successfully using Application Default Credentials.")
-        return service_instance
+        return build
     except DefaultCredentialsError:
         logging.error(
             "Authentication failed. Could not find Application Default Credentials. "
@@ -54,7 +109,7 @@ def get_youtube_service():
     except Exception as e:
         # Catch any other unexpected errors.
         logging.error(f"An unexpected error occurred while building YouTube service: {e}")
-        # The instance remains None, and we won't check again.
+        # The builder remains None, and we won't check again.
         return None
 
 def extract_video_id_from_url(url):
@@ -63,72 +118,222 @@ def extract_video_id_from_url(url):
     match = re.search(regex, url)
     return match.group(1) if match else None
 
-def get_video_details(video_ids):
+def _is_http_error(e):
+    """True for a googleapiclient HttpError. Does not import the client library just to check."""
+    errors = sys.modules.get('googleapiclient.errors')
+    return errors is not None and isinstance(e, errors.HttpError)
+
+def _execute(api_request, method):
+    """Executes a YouTube API request, recording its latency, quota cost and errors."""
+    metrics.inc('youtube_requests_total', method=method)
+    metrics.inc('youtube_quota_units_total', YOUTUBE_QUOTA_COSTS[method], method=method)
+    with metrics.timer('youtube_request_seconds', method=method):
+        try:
+            return api_request.execute()
+        except Exception as e:
+            status = str(e.resp.status) if _is_http_error(e) else 'error'
+            metrics.inc('youtube_errors_total', method=method, status=status)
+            raise
+
+def _fetch_video_details(youtube, video_ids, deadline=None):
     """
     Fetches details for a list of YouTube video IDs, handling batching for efficiency.
     The YouTube API v3 videos.list method can accept up to 50 IDs at once.
+    Raises HttpError on failure so callers can tell errors apart from missing videos,
+    and TimeoutError if a chunk is still to be fetched once `deadline` (a
+    time.monotonic() value) has passed.
     """
-    youtube = get_youtube_service()
-    if not youtube or not video_ids:
-        return []
-
     all_videos = []
     chunk_size = 50  # YouTube API limit for videos.list
 
-    try:
-        for i in range(0, len(video_ids), chunk_size):
-            chunk = video_ids[i:i + chunk_size]
-            
-            response = youtube.videos().list(
-                part='snippet,statistics',
-                id=','.join(chunk)
-            ).execute()
-
-            for item in response.get('items', []):
-                snippet = item.get('snippet', {})
-                stats = item.get('statistics', {})
-                thumbnails = snippet.get('thumbnails', {})
-                # Prefer a higher quality thumbnail, but fall back to default.
-                thumbnail_url = thumbnails.get('high', {}).get('url') or thumbnails.get('default', {}).get('url')
-                all_videos.append({
-                    'id': item.get('id'),
-                    'title': snippet.get('title'),
-                    'view_count': int(stats.get('viewCount', 0)),
-                    'thumbnail_url': thumbnail_url,
-                })
-        return all_videos
-    except HttpError as e:
-        logging.error(f"An HTTP error {e.resp.status} occurred while fetching video details: {e.content}")
-        return []
+    for i in range(0, len(video_ids), chunk_size):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"gave up on {len(video_ids) - i} of {len(video_ids)} video IDs at the deadline")
+        chunk = video_ids[i:i + chunk_size]
 
-def search_videos(query, max_results=6):
-    """Searches for YouTube videos based on a query."""
-    youtube = get_youtube_service()
-    if not youtube:
-        return []
+        response = _execute(youtube.videos().list(
+            part='snippet,statistics',
+            id=','.join(chunk)
+        ), 'videos.list')
 
-    try:
-        response = youtube.search().list(
-            q=query,
-            part='snippet',
-            maxResults=max_results,
-            type='video',
-            videoEmbeddable='true'
-        ).execute()
-
-        videos = []
         for item in response.get('items', []):
             snippet = item.get('snippet', {})
+            stats = item.get('statistics', {})
             thumbnails = snippet.get('thumbnails', {})
             # Prefer a higher quality thumbnail, but fall back to default.
             thumbnail_url = thumbnails.get('high', {}).get('url') or thumbnails.get('default', {}).get('url')
-            videos.append({
-                'id': item.get('id', {}).get('videoId'),
+            all_videos.append({
+                'id': item.get('id'),
                 'title': snippet.get('title'),
+                'view_count': int(stats.get('viewCount', 0)),
                 'thumbnail_url': thumbnail_url,
-                'channel_title': snippet.get('channelTitle'),
             })
-        return videos
-    except HttpError as e:
-        logging.error(f"An HTTP error {e.resp.status} occurred while searching videos: {e.content}")
-        return []
\ No newline at end of file
+    return all_videos
+
+# The video details cache is created on first use so its location and lifetimes
+# can be configured through the environment (or replaced via configure_video_cache).
+# The default store is in the system temporary directory, which is writable on
+# App Engine, unlike the application directory.
+DEFAULT_YOUTUBE_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'career-advisor-youtube-cache.db')
+_video_cache_state = {'instance': None}
+_video_cache_lock = threading.Lock()
+
+def configure_video_cache(cache):
+    """Replaces the video details cache, e.g. with one pointing at a temporary store."""
+    _video_cache_state['instance'] = cache
+
+def get_video_cache():
+    """Returns the shared VideoDetailsCache, creating it from environment settings if needed."""
+    with _video_cache_lock:
+        if _video_cache_state['instance'] is None:
+            _video_cache_state['instance'] = VideoDetailsCache(
+                os.environ.get('YOUTUBE_CACHE_PATH', DEFAULT_YOUTUBE_CACHE_PATH),
+                ttl=int(os.environ.get('YOUTUBE_CACHE_TTL', 7 * 24 * 3600)),
+                negative_ttl=int(os.environ.get('YOUTUBE_CACHE_NEGATIVE_TTL', 24 * 3600)),
+                stale_ttl=int(os.environ.get('YOUTUBE_CACHE_STALE_TTL', 30 * 24 * 3600)),
+            )
+        return _video_cache_state['instance']
+
+def get_video_details(video_ids, youtube=None, deadline=None):
+    """
+    Returns details for a list of YouTube video IDs, served from the video cache
+    where possible. Only IDs without a usable cache entry reach the YouTube API.
+    `youtube` overrides the service object (e.g. a local fake of videos().list).
+    With a `deadline` (a time.monotonic() value), no API call is started after it
+    and only cached details are returned for the rest.
+    """
+    if not video_ids:
+        return []
+    available = youtube or get_youtube_service()
+
+    def fetch(ids, deadline=None):
+        # Stale entries are refreshed on the cache's own thread, so the service is
+        # looked up by whichever thread runs the fetch rather than captured here.
+        service = youtube or get_youtube_service()
+        if service is None:
+            raise RuntimeError("YouTube service is unavailable")
+        try:
+            return _fetch_video_details(service, ids, deadline)
+        except Exception as e:
+            if _is_http_error(e):
+                logging.error(f"An HTTP error {e.resp.status} occurred while fetching video details: {e.content}")
+            raise
+
+    # Without a service we can still answer from whatever is already cached.
+    if not available:
+        return get_video_cache().get_many(list(video_ids))
+    # Background refreshes of stale entries are not bound by this caller's deadline.
+    return get_video_cache().get_many(list(video_ids), functools.partial(fetch, deadline=deadline), fetch)
+
+def collect_project_video_ids(careers_data):
+    """Returns the unique video IDs referenced by project ideas across a career catalog."""
+    video_ids = {}
+    for career in careers_data or []:
+        for p in career.get('project_ideas', []):
+            video_id = extract_video_id_from_url(p.get('youtube_url', ''))
+            if video_id:
+                video_ids[video_id] = True
+    return list(video_ids)
+
+def prewarm_video_cache(careers_data, youtube=None):
+    """
+    Fills the video cache with every project video referenced by the catalog,
+    so steady-state requests are answered without calling YouTube.
+    """
+    video_ids = collect_project_video_ids(careers_data)
+    details = get_video_details(video_ids, youtube=youtube)
+    logging.info(f"Pre-warmed video cache: {len(details)} of {len(video_ids)} project videos available.")
+    return details
+
+def _search_videos_uncached(youtube, query, max_results):
+    """Runs a search().list call; raises HttpError on failure."""
+    response = _execute(youtube.search().list(
+        q=query,
+        part='snippet',
+        maxResults=max_results,
+        type='video',
+        videoEmbeddable='true'
+    ), 'search.list')
+
+    videos = []
+    for item in response.get('items', []):
+        snippet = item.get('snippet', {})
+        thumbnails = snippet.get('thumbnails', {})
+        # Prefer a higher quality thumbnail, but fall back to default.
+        thumbnail_url = thumbnails.get('high', {}).get('url') or thumbnails.get('default', {}).get('url')
+        videos.append({
+            'id': item.get('id', {}).get('videoId'),
+            'title': snippet.get('title'),
+            'thumbnail_url': thumbnail_url,
+            'channel_title': snippet.get('channelTitle'),
+        })
+    return videos
+
+# Search results are cached per normalized query. Each search().list call costs
+# 100 quota units, so concurrent identical queries also share a single upstream
+# call ("single flight") instead of each issuing their own.
+_search_cache = TTLCache(
+    maxsize=int(os.environ.get('SEARCH_CACHE_SIZE', 1024)),
+    ttl=int(os.environ.get('SEARCH_CACHE_TTL', 6 * 3600)),
+)
+_search_inflight = {}
+_search_lock = threading.Lock()
+_search_stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+def _normalize_query(query):
+    """Case- and whitespace-insensitive cache key for a search query."""
+    return ' '.join(query.lower().split())
+
+def get_search_cache_stats():
+    """
+    Returns hit/miss/coalesced counters and the current size of the search cache
+    for this process. The counts are kept even when METRICS_ENABLED is off;
+    /metrics reports them summed across workers.
+    """
+    with _search_lock:
+        return {**_search_stats, 'size': len(_search_cache)}
+
+def search_videos(query, max_results=6):
+    """
+    Searches for YouTube videos based on a query.
+    Results are served from the search cache when possible; callers share the
+    returned video dicts and must not modify them.
+    """
+    key = (_normalize_query(query), max_results)
+
+    with _search_lock:
+        cached = _search_cache.get(key, MISSING)
+        if cached is not MISSING:
+            _search_stats['hits'] += 1
+            metrics.inc('search_cache_lookups_total', result='hit')
+            return list(cached)
+        future = _search_inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _search_inflight[key] = future
+            _search_stats['misses'] += 1
+        else:
+            _search_stats['coalesced'] += 1
+    metrics.inc('search_cache_lookups_total', result='miss' if is_leader else 'coalesced')
+
+    if not is_leader:
+        return list(future.result())
+
+    videos = []
+    try:
+        youtube = get_youtube_service()
+        if youtube:
+            videos = _search_videos_uncached(youtube, query, max_results)
+            _search_cache.set(key, videos)
+    except Exception as e:
+        # Errors are shared with coalesced callers but never cached.
+        if _is_http_error(e):
+            logging.error(f"An HTTP error {e.resp.status} occurred while searching videos: {e.content}")
+        else:
+            logging.error(f"An unexpected error occurred while searching videos: {e}")
+    finally:
+        with _search_lock:
+            _search_inflight.pop(key, None)
+        future.set_result(videos)
+    return list(videos)